@@ -14,7 +14,6 @@ from pathlib import Path
 
 from django.utils import timezone
 from dotenv import load_dotenv
-from django.core.cache import cache
 
 load_dotenv()
 
@@ -140,6 +139,8 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_TASK_TRACK_STARTED = True
+CELERY_RESULT_EXPIRES = 3600
 
 CACHES = {
     'default': {
@@ -155,11 +156,21 @@ CACHES = {
             # 'PASSWORD': 'ваш_пароль',
         },
         'KEY_PREFIX': 'myapp',  # Префикс для всех ключей
+    },
+    # Кеш фрагментов страниц: при недоступности Redis страницы рендерятся без кеша
+    'pages': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 5,
+            'SOCKET_TIMEOUT': 5,
+            'IGNORE_EXCEPTIONS': True,
+        },
+        'KEY_PREFIX': 'myapp',
     }
 }
 
-cache.set('API_REQUESTS_COUNTER', 0)
-
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
     'updates_assets': {
@@ -169,15 +180,17 @@ CELERY_BEAT_SCHEDULE = {
             'start_time': timezone.now()
         }
     },
-    'reset_counter': {
-        'task': 'strategy.tasks.reset_counter',
-        'schedule': 120.0,
+    'compact_price_history': {
+        'task': 'strategy.tasks.compact_price_history',
+        'schedule': 86400.0,
         'options': {
             'start_time': timezone.now()
         }
     },
 }
 
+CANDLES_CACHE_DIR = os.getenv('CANDLES_CACHE_DIR', default=BASE_DIR / 'candles')
+
 TELEGRAM_URL = os.getenv('TELEGRAM_URL')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 
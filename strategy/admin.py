@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CheckAssets, AssetData, Settings, AssetDividend, AssetCandidates
+from .models import CheckAssets, AssetData, Instrument, Settings, DividendCalendar, AssetDividend, AssetCandidates
 
 
 @admin.register(CheckAssets)
@@ -22,13 +22,22 @@ class CheckAssetsAdmin(admin.ModelAdmin):
 
 @admin.register(AssetData)
 class AssetDataAdmin(admin.ModelAdmin):
-    list_display = ['ticker', 'class_code', 'nano', 'units', 'get_price', 'logo_url']
+    list_display = ['ticker', 'class_code', 'figi', 'get_price', 'lot', 'logo_url']
     search_fields = ['ticker']
 
     class Meta:
         model = AssetData
         fields = '__all__'
 
+@admin.register(Instrument)
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ['ticker', 'class_code', 'figi', 'currency', 'name', 'updated_at']
+    search_fields = ['ticker', 'figi', 'name']
+
+    class Meta:
+        model = Instrument
+        fields = '__all__'
+
 @admin.register(Settings)
 class SettingsAdmin(admin.ModelAdmin):
     list_display = [
@@ -45,9 +54,18 @@ class SettingsAdmin(admin.ModelAdmin):
         model = Settings
         fields = '__all__'
 
+@admin.register(DividendCalendar)
+class DividendCalendarAdmin(admin.ModelAdmin):
+    list_display = ['ticker', 'company_name', 'payday', 'dividend', 'figi', 'updated_at']
+    search_fields = ['ticker', 'company_name']
+
+    class Meta:
+        model = DividendCalendar
+        fields = '__all__'
+
 @admin.register(AssetDividend)
 class AssetDividendAdmin(admin.ModelAdmin):
-    list_display = ['ticker', 'company_name', 'payday', 'dividend', 'profitability', 'price', 'priority', 'max_part']
+    list_display = ['ticker', 'priority', 'max_part', 'owner']
 
     class Meta:
         model = AssetDividend
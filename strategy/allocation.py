@@ -0,0 +1,78 @@
+import numpy as np
+
+# Количество шагов, на которые делится доступный капитал в задаче о рюкзаке
+CAPITAL_RESOLUTION = 10_000
+# Ограничение дивидендов по одной акции: 21% годовых от капитала за месяц
+MONTHLY_DIVIDEND_LIMIT = 0.21 / 12
+
+
+def split_bound(bound):
+    """Двоичное разбиение ограничения количества: 1, 2, 4, ..., остаток"""
+    parts = []
+    size = 1
+
+    while bound > 0:
+        part = min(size, bound)
+        parts.append(part)
+        bound -= part
+        size *= 2
+
+    return parts
+
+
+def allocate(prices, dividends, max_parts, available_capital, broker_commission, dividend_tax, lots=None):
+    """Распределение капитала по кандидатам с максимальным дивидендом после налога
+
+    Решается ограниченная задача о рюкзаке над количеством лотов: суммарные
+    затраты с комиссией на покупку и продажу не превышают капитал, затраты
+    на акцию не превышают max_part процентов капитала, а дивиденд по акции —
+    MONTHLY_DIVIDEND_LIMIT капитала. Капитал дискретизируется с округлением
+    затрат вверх, поэтому найденное решение всегда допустимо.
+
+    Возвращает массив количества акций (кратного лоту) для каждого кандидата.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    dividends = np.asarray(dividends, dtype=np.float64)
+    max_parts = np.asarray(max_parts, dtype=np.float64)
+    lots = np.ones(len(prices), dtype=np.int64) if lots is None else np.asarray(lots, dtype=np.int64)
+    counts = np.zeros(len(prices), dtype=np.int64)
+
+    if not len(prices) or available_capital <= 0:
+        return counts
+
+    lot_costs = prices * lots * (1 + broker_commission / 100 * 2)
+    lot_values = dividends * lots * (1 - dividend_tax / 100)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        by_part = np.floor(available_capital * max_parts / 100 / (prices * lots))
+        by_dividend = np.floor(available_capital * MONTHLY_DIVIDEND_LIMIT / (dividends * lots))
+    bounds = np.nan_to_num(np.minimum(by_part, by_dividend), nan=0, posinf=0).clip(min=0).astype(np.int64)
+    bounds[(lot_costs <= 0) | (lot_values <= 0)] = 0
+
+    grain = max(available_capital / CAPITAL_RESOLUTION, 0.01)
+    capacity = int(available_capital // grain)
+    weights = np.ceil(lot_costs / grain - 1e-9).clip(min=1).astype(np.int64)
+
+    # Каждое ограничение разбивается на 0/1-предметы, которые добавляются векторно по всем уровням капитала
+    best = np.zeros(capacity + 1)
+    items = []
+    for index in np.flatnonzero(bounds):
+        for part in split_bound(int(bounds[index])):
+            weight = int(weights[index]) * part
+            if weight > capacity:
+                continue
+
+            candidate = best[:-weight] + lot_values[index] * part
+            taken = np.zeros(capacity + 1, dtype=bool)
+            taken[weight:] = candidate > best[weight:]
+            best[weight:] = np.where(taken[weight:], candidate, best[weight:])
+            items.append((index, part, weight, taken))
+
+    # Восстановление решения с конца
+    level = int(np.argmax(best))
+    for index, part, weight, taken in reversed(items):
+        if taken[level]:
+            counts[index] += part
+            level -= weight
+
+    return counts * lots
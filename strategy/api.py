@@ -0,0 +1,10 @@
+from strategy.rate_limiter import RateLimiter
+
+API_REQUESTS_LIMIT = 190
+
+api_limiter = RateLimiter('API_REQUESTS', capacity=API_REQUESTS_LIMIT, period=60)
+
+
+async def wait_api_limit(log=print):
+    """Ожидание свободного места в лимите запросов к API"""
+    await api_limiter.acquire(log)
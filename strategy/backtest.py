@@ -0,0 +1,129 @@
+import hashlib
+import logging
+
+import numpy as np
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Ограничение размера промежуточных массивов (параметры x покупки x дни): около 16 МБ на массив float64
+MAX_CHUNK_ELEMENTS = 2_000_000
+CACHE_TIMEOUT = 7 * 24 * 3600
+
+
+def data_fingerprint(dates, prices):
+    """Отпечаток ряда цен для ключа кеша результатов"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(dates).view(np.int64).tobytes())
+    digest.update(np.ascontiguousarray(prices, dtype=np.float64).tobytes())
+
+    return digest.hexdigest()
+
+
+def simulate(dates, prices, key_rates, markups, buy_step=1):
+    """Проигрывание правила продажи по ключевой ставке для сетки параметров
+
+    Для каждой даты покупки i ищется первый день j > i, в который цена выше
+    buy * (1 + key_rate / месяцы владения) и выше buy * (1 + markup), как в
+    CheckAssets.get_is_can_sold. Даты покупки и параметры считаются блоками
+    массивов формы (параметры, покупки, дни).
+
+    Возвращает словарь массивов длины len(key_rates) с показателями.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    prices = np.asarray(prices, dtype=np.float64)
+    key_rates = np.asarray(key_rates, dtype=np.float64)
+    markups = np.asarray(markups, dtype=np.float64)
+
+    buy_index = np.arange(0, len(prices) - 1, buy_step)
+    month = dates.astype('datetime64[M]').astype(np.int64)
+    days = np.arange(len(prices))
+
+    if not len(buy_index):
+        return {
+            'hit_rate': np.zeros(len(key_rates)),
+            'avg_return': np.full(len(key_rates), np.nan),
+            'avg_holding_days': np.full(len(key_rates), np.nan),
+            'mtm_return': np.zeros(len(key_rates))
+        }
+
+    hits = np.zeros(len(key_rates), dtype=np.int64)
+    return_sum = np.zeros(len(key_rates))
+    holding_sum = np.zeros(len(key_rates))
+    mtm_sum = np.zeros(len(key_rates))
+
+    # Даты покупки и параметры обрабатываются блоками, чтобы массивы оставались в пределах MAX_CHUNK_ELEMENTS
+    buy_chunk = max(1, MAX_CHUNK_ELEMENTS // len(prices))
+    for buy_start in range(0, len(buy_index), buy_chunk):
+        block = buy_index[buy_start:buy_start + buy_chunk]
+        buy_prices = prices[block]
+        months = month[None, :] - month[block, None]
+        months = np.where(months == 0, 1, months)
+        is_after_buy = days[None, :] > block[:, None]
+
+        chunk = max(1, MAX_CHUNK_ELEMENTS // months.size)
+        for start in range(0, len(key_rates), chunk):
+            rates = key_rates[start:start + chunk, None, None]
+            markup = markups[start:start + chunk, None, None]
+
+            # Цена должна превысить обе ожидаемые цены, то есть максимальную из них
+            growth = np.maximum(rates / months[None, :, :], markup)
+            is_sold = (prices[None, None, :] > buy_prices[None, :, None] * (1 + growth)) & is_after_buy[None, :, :]
+
+            is_hit = is_sold.any(axis=2)
+            sell_index = np.where(is_hit, is_sold.argmax(axis=2), len(prices) - 1)
+            returns = prices[sell_index] / buy_prices[None, :] - 1
+            holding_days = (dates[sell_index] - dates[block][None, :]).astype(np.int64)
+
+            hits[start:start + chunk] += is_hit.sum(axis=1)
+            return_sum[start:start + chunk] += np.where(is_hit, returns, 0).sum(axis=1)
+            holding_sum[start:start + chunk] += np.where(is_hit, holding_days, 0).sum(axis=1)
+            # Непроданные позиции оцениваются по последней цене ряда
+            mtm_sum[start:start + chunk] += returns.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_return = return_sum / hits
+        avg_holding_days = holding_sum / hits
+
+    return {
+        'hit_rate': hits / len(buy_index),
+        'avg_return': avg_return,
+        'avg_holding_days': avg_holding_days,
+        'mtm_return': mtm_sum / len(buy_index)
+    }
+
+
+def run_backtest(name, dates, prices, grid, buy_step=1):
+    """Back-test сетки параметров [(key_rate, markup), ...] с кешированием результатов
+
+    Результат каждого набора параметров кешируется по ряду цен и шагу покупок,
+    пересчитываются только отсутствующие в кеше наборы. При недоступности
+    Redis расчет выполняется без кеша.
+    """
+    fingerprint = data_fingerprint(dates, prices)
+    keys = {
+        params: f'backtest:{name}:{fingerprint}:{buy_step}:{params[0]}:{params[1]}'
+        for params in grid
+    }
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except RedisError as e:
+        logger.warning("Кеш результатов back-test недоступен, расчет без кеша: %r", e)
+        cached = {}
+    missing = [params for params in grid if keys[params] not in cached]
+
+    if missing:
+        key_rates, markups = zip(*missing)
+        metrics = simulate(dates, prices, key_rates, markups, buy_step)
+        computed = {
+            keys[params]: {metric: float(values[i]) for metric, values in metrics.items()}
+            for i, params in enumerate(missing)
+        }
+        try:
+            cache.set_many(computed, CACHE_TIMEOUT)
+        except RedisError as e:
+            logger.warning("Результаты back-test не сохранены в кеш: %r", e)
+        cached.update(computed)
+
+    return {params: cached[keys[params]] for params in grid}
@@ -0,0 +1,96 @@
+import numpy as np
+from django.db import transaction
+
+from strategy.allocation import allocate
+from strategy.dividends import load_user_dividends
+from strategy.models import AssetCandidates, AssetData
+from strategy.money import NANO, ceil_to_step
+from strategy.page_cache import bump_user_data
+
+
+def build_candidates(owner, user_settings, rows):
+    """Расчет кандидатов массивами по всем дивидендным акциям пользователя
+
+    Цены и дивиденды передаются в нано-рублях, затраты и дивиденды после
+    налога считаются в int64 с округлением комиссии и налога до нано-рубля.
+    Цена покупки округляется вверх до шага цены инструмента, чтобы затраты
+    соответствовали цене, по которой можно выставить заявку.
+    Возвращает несохраненные AssetCandidates и тикеры с незаполненными данными.
+    """
+    tickers = np.array([row[0] for row in rows], dtype=object)
+    prices = ceil_to_step(
+        np.array([row[1] for row in rows], dtype=np.int64), np.array([row[5] for row in rows], dtype=np.int64)
+    )
+    dividends = np.array([row[2] for row in rows], dtype=np.int64)
+    max_parts = np.array([row[3] for row in rows], dtype=np.float64)
+    lots = np.array([row[4] or 1 for row in rows], dtype=np.int64)
+
+    # None в max_part превращается в nan
+    is_complete = (max_parts > 0) & (prices > 0) & (dividends > 0)
+    incomplete = tickers[~is_complete].tolist()
+    tickers, prices, dividends, max_parts, lots = (
+        column[is_complete] for column in (tickers, prices, dividends, max_parts, lots)
+    )
+
+    available_capital = float(user_settings.available_capital)
+    broker_commission = float(user_settings.broker_commission)
+    dividend_tax = float(user_settings.dividend_tax)
+
+    counts = allocate(
+        prices / NANO, dividends / NANO, max_parts, available_capital, broker_commission, dividend_tax, lots
+    )
+    amounts = prices * counts
+    costs = amounts + np.rint(amounts * (broker_commission / 100 * 2)).astype(np.int64)
+    shares = costs / (available_capital * NANO) * 100 if available_capital else np.zeros(len(costs))
+    gross_dividends = dividends * counts
+    net_dividends = gross_dividends - np.rint(gross_dividends * (dividend_tax / 100)).astype(np.int64)
+
+    candidates = [
+        AssetCandidates(
+            ticker=ticker,
+            price=price,
+            count=count,
+            costs=cost,
+            share=share,
+            dividend=dividend,
+            owner=owner
+        )
+        for ticker, price, count, cost, share, dividend in zip(
+            tickers.tolist(), prices.tolist(), counts.tolist(), costs.tolist(), shares.tolist(), net_dividends.tolist()
+        )
+    ]
+
+    return candidates, incomplete
+
+
+def refresh_candidates(settings_list):
+    """Пересчет и атомарная замена кандидатов пользователей по их настройкам
+
+    Возвращает количество рассчитанных кандидатов и словарь владелец -> тикеры
+    с незаполненными данными.
+    """
+    dividends = load_user_dividends(settings_list)
+    tickers = {row.ticker for rows in dividends.values() for row in rows}
+    # Первая запись AssetData по тикеру, как в снимке цен
+    steps = dict(
+        AssetData.objects.filter(ticker__in=tickers).order_by('-pk').values_list('ticker', 'min_price_increment')
+    )
+    candidates = []
+    incomplete = {}
+
+    for user_settings in settings_list:
+        rows = [
+            (row.ticker, row.price, row.dividend, row.max_part, row.lot, steps.get(row.ticker, 0))
+            for row in dividends[user_settings.owner_id]
+        ]
+        user_candidates, user_incomplete = build_candidates(user_settings.owner, user_settings, rows)
+        candidates.extend(user_candidates)
+        if user_incomplete:
+            incomplete[user_settings.owner] = user_incomplete
+
+    with transaction.atomic():
+        AssetCandidates.objects.filter(owner_id__in=dividends).delete()
+        AssetCandidates.objects.bulk_create(candidates)
+    bump_user_data(dividends)
+
+    return len(candidates), incomplete
@@ -0,0 +1,121 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+
+from strategy.money import quotation_to_nano
+
+# Максимальный период одного запроса дневных свечей
+MAX_REQUEST_PERIOD = timedelta(days=365)
+CANDLE_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', np.int64),
+    ('high', np.int64),
+    ('low', np.int64),
+    ('close', np.int64),
+    ('volume', np.int64),
+])
+
+
+def candles_to_array(candles):
+    """Преобразование завершенных свечей API в массив CANDLE_DTYPE"""
+    candles = [candle for candle in candles if candle.is_complete]
+    result = np.empty(len(candles), dtype=CANDLE_DTYPE)
+
+    for i, candle in enumerate(candles):
+        result[i] = (
+            candle.time.date(),
+            quotation_to_nano(candle.open),
+            quotation_to_nano(candle.high),
+            quotation_to_nano(candle.low),
+            quotation_to_nano(candle.close),
+            candle.volume,
+        )
+
+    return result
+
+
+def split_period(start, end):
+    """Разбиение периода [start, end) на интервалы, допустимые для одного запроса"""
+    while start < end:
+        chunk_end = min(start + MAX_REQUEST_PERIOD, end)
+        yield start, chunk_end
+        start = chunk_end
+
+
+def to_datetime(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+class CandleCache:
+    """Дневные свечи инструмента на диске: массив .npy и список загруженных периодов
+
+    Массив читается через memory map, поэтому чтение многолетней истории
+    не требует загрузки всего файла в память.
+    """
+
+    def __init__(self, figi, directory=None):
+        directory = directory or settings.CANDLES_CACHE_DIR
+        self.path = os.path.join(directory, f'{figi}.npy')
+        self.meta_path = os.path.join(directory, f'{figi}.json')
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+
+        return np.load(self.path, mmap_mode='r')
+
+    def covered(self):
+        """Загруженные периоды [начало, конец) в порядке возрастания"""
+        if not os.path.exists(self.meta_path):
+            return []
+
+        with open(self.meta_path) as file:
+            return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in json.load(file)]
+
+    def missing(self, start, end):
+        """Периоды внутри [start, end), которых еще нет в кеше"""
+        gaps = []
+
+        for covered_start, covered_end in self.covered():
+            if covered_end <= start:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > start:
+                gaps.append((start, covered_start))
+            start = max(start, covered_end)
+
+        if start < end:
+            gaps.append((start, end))
+
+        return gaps
+
+    def merge(self, candles, periods):
+        """Добавление свечей и отметка периодов как загруженных"""
+        existing = np.array(self.read())
+        merged = np.concatenate([existing, candles])
+        # При совпадении дат остается последняя загруженная свеча
+        _, index = np.unique(merged['date'][::-1], return_index=True)
+        merged = merged[::-1][index]
+
+        ranges = sorted(self.covered() + list(periods))
+        covered = []
+        for start, end in ranges:
+            if covered and start <= covered[-1][1]:
+                covered[-1] = (covered[-1][0], max(covered[-1][1], end))
+            else:
+                covered.append((start, end))
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Запись через временные файлы, чтобы читатели не видели частично записанный кеш
+        with open(f'{self.path}.tmp', 'wb') as file:
+            np.save(file, merged)
+        with open(f'{self.meta_path}.tmp', 'w') as file:
+            json.dump([(start.isoformat(), end.isoformat()) for start, end in covered], file)
+        os.replace(f'{self.path}.tmp', self.path)
+        os.replace(f'{self.meta_path}.tmp', self.meta_path)
+
+        return len(merged)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from strategy.api import wait_api_limit
+from strategy.models import Instrument
+from strategy.money import quotation_to_nano
+
+CATALOG_TTL = timedelta(days=1)
+CATALOG_MIN_REFRESH_INTERVAL = timedelta(minutes=10)
+
+
+def get_logo_url(brand):
+    if brand and brand.logo_name:
+        return f'https://invest-brands.cdn-tinkoff.ru/{brand.logo_name[:-4]}x160.png'
+
+    return None
+
+
+async def get_updated_at():
+    """Время последнего обновления справочника или None, если справочник пуст"""
+    return await Instrument.objects.order_by('-updated_at').values_list('updated_at', flat=True).afirst()
+
+
+async def refresh_instruments(client, log=print):
+    """Загрузка списка акций из API и сохранение его в справочник"""
+    await wait_api_limit(log)
+    response = await client.instruments.shares()
+
+    updated_at = timezone.now()
+    instruments = [
+        Instrument(
+            figi=share.figi,
+            ticker=share.ticker,
+            class_code=share.class_code,
+            currency=share.currency,
+            name=share.name,
+            logo_url=get_logo_url(share.brand),
+            lot=share.lot or 1,
+            min_price_increment=quotation_to_nano(share.min_price_increment),
+            updated_at=updated_at
+        )
+        for share in response.instruments
+        if share.figi and share.ticker
+    ]
+    await Instrument.objects.abulk_create(
+        instruments,
+        update_conflicts=True,
+        unique_fields=['figi'],
+        update_fields=['ticker', 'class_code', 'currency', 'name', 'logo_url', 'lot', 'min_price_increment', 'updated_at']
+    )
+    # Инструменты, пропавшие из ответа API, исключены из торгов
+    await Instrument.objects.filter(updated_at__lt=updated_at).adelete()
+
+    return instruments
+
+
+async def get_instruments(client, force=False, log=print):
+    """Справочник акций, обновляемый из API не чаще, чем раз в CATALOG_TTL"""
+    updated_at = await get_updated_at()
+
+    if force or updated_at is None or timezone.now() - updated_at > CATALOG_TTL:
+        log("Обновление справочника инструментов...")
+        return await refresh_instruments(client, log)
+
+    return [instrument async for instrument in Instrument.objects.all()]
+
+
+async def find_instruments(client, tickers, log=print):
+    """Поиск акций по тикерам с обновлением справочника при промахе"""
+    tickers = set(tickers)
+
+    async def lookup():
+        found = {}
+        async for instrument in Instrument.objects.filter(ticker__in=tickers).order_by('pk'):
+            found.setdefault(instrument.ticker, instrument)
+        return found
+
+    instruments = await lookup()
+
+    if len(instruments) < len(tickers):
+        updated_at = await get_updated_at()
+        if updated_at is None or timezone.now() - updated_at > CATALOG_MIN_REFRESH_INTERVAL:
+            await refresh_instruments(client, log)
+            instruments = await lookup()
+
+    return instruments
@@ -0,0 +1,138 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from strategy.models import AssetDividend, DividendCalendar
+from strategy.price_snapshot import aget_market_data, bump_version, get_market_data
+
+# Период, в течение которого обновленный календарь не запрашивается из API повторно
+CALENDAR_TTL = timedelta(hours=12)
+CALENDAR_WINDOWS_KEY = 'dividend_calendar:windows'
+
+DividendRow = namedtuple('DividendRow', [
+    'pk', 'ticker', 'company_name', 'payday', 'dividend', 'price', 'profitability', 'priority', 'max_part', 'lot',
+    'logo_url'
+])
+
+
+def get_refreshed_windows():
+    """Периоды, обновленные не раньше CALENDAR_TTL назад: [(начало, конец, время обновления), ...]"""
+    expired_at = timezone.now() - CALENDAR_TTL
+
+    return [window for window in cache.get(CALENDAR_WINDOWS_KEY, []) if window[2] > expired_at]
+
+
+def is_calendar_fresh(date_from, date_to):
+    """Покрыт ли период недавним обновлением календаря"""
+    return any(start <= date_from and date_to <= end for start, end, _ in get_refreshed_windows())
+
+
+def save_calendar(dividends, tickers, date_from, date_to):
+    """Сохранение дивидендов за период и удаление отмененных выплат по запрошенным тикерам
+
+    Возвращает количество удаленных записей.
+    """
+    updated_at = timezone.now()
+    for dividend in dividends:
+        dividend.updated_at = updated_at
+
+    with transaction.atomic():
+        DividendCalendar.objects.bulk_create(
+            dividends,
+            update_conflicts=True,
+            unique_fields=['ticker', 'payday'],
+            update_fields=['figi', 'company_name', 'dividend', 'updated_at'],
+            batch_size=1000
+        )
+        deleted, _ = DividendCalendar.objects.filter(
+            ticker__in=tickers,
+            payday__range=(date_from, date_to),
+            updated_at__lt=updated_at
+        ).delete()
+
+    windows = get_refreshed_windows()
+    windows.append((date_from, date_to, updated_at))
+    cache.set(CALENDAR_WINDOWS_KEY, windows, int(CALENDAR_TTL.total_seconds()))
+    # Календарь общий для всех пользователей, поэтому сбрасываются страницы всех пользователей
+    bump_version()
+
+    return deleted
+
+
+def dividend_queries(settings_list):
+    """Независимые запросы календаря и настроек для объединения периодов пользователей"""
+    date_from = min(user_settings.dividends_from_date for user_settings in settings_list)
+    date_to = max(user_settings.dividends_to_date for user_settings in settings_list)
+    calendar = DividendCalendar.objects.filter(payday__range=(date_from, date_to))
+
+    return (
+        calendar.order_by('payday', 'pk').values_list('pk', 'ticker', 'company_name', 'payday', 'dividend'),
+        AssetDividend.objects.filter(
+            owner_id__in=[user_settings.owner_id for user_settings in settings_list]
+        ).values_list('owner_id', 'ticker', 'priority', 'max_part'),
+    )
+
+
+def join_dividends(settings_list, calendar, preferences, assets):
+    """Объединение календаря с настройками и ценами по периодам отсечки пользователей"""
+    paydays = [row[3] for row in calendar]
+    preferences = {
+        (owner_id, ticker): (priority, max_part) for owner_id, ticker, priority, max_part in preferences
+    }
+
+    result = {}
+    for user_settings in settings_list:
+        rows = {}
+        start = bisect_left(paydays, user_settings.dividends_from_date)
+        end = bisect_right(paydays, user_settings.dividends_to_date)
+
+        for pk, ticker, company_name, payday, dividend in calendar[start:end]:
+            if ticker in rows or ticker not in assets or not assets[ticker][0]:
+                continue
+            price, lot, logo_url = assets[ticker]
+            priority, max_part = preferences.get((user_settings.owner_id, ticker), (None, None))
+            rows[ticker] = DividendRow(
+                pk, ticker, company_name, payday, dividend, price, dividend / price * 100, priority, max_part, lot,
+                logo_url
+            )
+
+        result[user_settings.owner_id] = sorted(rows.values(), key=lambda row: row.profitability, reverse=True)
+
+    return result
+
+
+def load_user_dividends(settings_list):
+    """Дивиденды в периодах отсечки пользователей вместе с их настройками и текущей ценой
+
+    Календарь и настройки читаются двумя запросами независимо от числа
+    пользователей, цены — из снимка в Redis. Для каждой акции берется первая отсечка в периоде
+    пользователя, акции без цены пропускаются. Возвращает словарь
+    id владельца -> список DividendRow по убыванию доходности, цены и
+    дивиденды в нано-рублях.
+    """
+    if not settings_list:
+        return {}
+
+    calendar, preferences = (list(queryset) for queryset in dividend_queries(settings_list))
+    assets = get_market_data({row[1] for row in calendar})
+
+    return join_dividends(settings_list, calendar, preferences, assets)
+
+
+async def aload_user_dividends(settings_list):
+    """Асинхронный вариант load_user_dividends: запросы выполняются через asyncio.gather"""
+    if not settings_list:
+        return {}
+
+    async def fetch(queryset):
+        return [row async for row in queryset]
+
+    calendar, preferences = await asyncio.gather(*(fetch(queryset) for queryset in dividend_queries(settings_list)))
+    assets = await aget_market_data({row[1] for row in calendar})
+
+    return join_dividends(settings_list, calendar, preferences, assets)
@@ -0,0 +1,48 @@
+from django import forms
+from django.db import models
+
+from strategy.money import nano_to_rub, rub_to_nano
+
+
+class RubFormField(forms.DecimalField):
+    """Ввод суммы в рублях для значения, хранящегося в нано-рублях"""
+
+    def __init__(self, **kwargs):
+        kwargs.pop('min_value', None)
+        kwargs.pop('max_value', None)
+        kwargs.setdefault('decimal_places', 9)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        # Начальное значение из модели приходит в нано-рублях, введенное пользователем — строкой
+        if isinstance(value, int):
+            return nano_to_rub(value)
+
+        return value
+
+    def to_python(self, value):
+        # Как и при редактировании в таблице, допускается запятая в качестве разделителя
+        if isinstance(value, str):
+            value = value.replace(',', '.')
+
+        return super().to_python(value)
+
+    def clean(self, value):
+        value = super().clean(value)
+
+        return None if value is None else rub_to_nano(value)
+
+    def has_changed(self, initial, data):
+        try:
+            value = self.to_python(data)
+        except forms.ValidationError:
+            return True
+
+        return (None if value is None else rub_to_nano(value)) != initial
+
+
+class NanoField(models.BigIntegerField):
+    """Денежная сумма в целых нано-рублях"""
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': RubFormField, **kwargs})
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from strategy.api import api_limiter
+
+
+class Command(BaseCommand):
+    help = "Текущее использование лимита запросов к API"
+
+    def handle(self, *args, **options):
+        usage = api_limiter.usage()
+        self.stdout.write(
+            self.style.WARNING(f"Использовано {usage['used']} из {usage['capacity']} запросов, доступно {usage['available']}")
+        )
@@ -0,0 +1,82 @@
+from itertools import product
+
+from django.core.management import BaseCommand
+
+from strategy.backtest import run_backtest
+from strategy.candles import CandleCache
+from strategy.models import Instrument
+from strategy.money import NANO
+from strategy.price_history import get_daily_closes
+
+
+class Command(BaseCommand):
+    help = "Back-test правила продажи по ключевой ставке на исторических ценах"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tickers',
+            nargs='+',
+            required=True,
+            help='Тикеры акций'
+        )
+        parser.add_argument(
+            '--key-rates',
+            nargs='+',
+            type=float,
+            default=[0.165],
+            help='Значения ключевой ставки (доли)'
+        )
+        parser.add_argument(
+            '--markups',
+            nargs='+',
+            type=float,
+            default=[0.05, 0.1, 0.2],
+            help='Наценки ожидаемой цены к цене покупки (доли)'
+        )
+        parser.add_argument(
+            '--step',
+            type=int,
+            default=1,
+            help='Шаг дат покупки в торговых днях'
+        )
+        parser.add_argument(
+            '--source',
+            choices=['candles', 'history'],
+            default='candles',
+            help='Источник цен: кеш свечей load_candles или история цен'
+        )
+
+    @staticmethod
+    def load_prices(ticker, source):
+        if source == 'history':
+            dates, closes = get_daily_closes(ticker)
+            return dates, closes / NANO
+
+        instrument = Instrument.objects.filter(ticker=ticker).order_by('pk').first()
+        if instrument is None:
+            return None, None
+
+        candles = CandleCache(instrument.figi).read()
+        return candles['date'], candles['close'] / NANO
+
+    def handle(self, *args, **options):
+        grid = list(product(options['key_rates'], options['markups']))
+
+        for ticker in options['tickers']:
+            dates, prices = self.load_prices(ticker, options['source'])
+
+            if dates is None or len(dates) < 2:
+                self.stdout.write(self.style.WARNING(f"{ticker}: недостаточно исторических цен"))
+                continue
+
+            self.stdout.write(self.style.SUCCESS(f"{ticker}: {len(dates)} дней с {dates[0]} по {dates[-1]}"))
+            results = run_backtest(f'{options["source"]}:{ticker}', dates, prices, grid, max(options['step'], 1))
+
+            for (key_rate, markup), metrics in results.items():
+                self.stdout.write(
+                    f"  ставка {key_rate:.3f}, наценка {markup:.3f}: "
+                    f"продажи {metrics['hit_rate'] * 100:.1f}%, "
+                    f"доходность продаж {metrics['avg_return'] * 100:.2f}%, "
+                    f"срок {metrics['avg_holding_days']:.0f} дн., "
+                    f"доходность с учетом непроданных {metrics['mtm_return'] * 100:.2f}%"
+                )
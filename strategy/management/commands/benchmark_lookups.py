@@ -0,0 +1,199 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from strategy.dividends import load_user_dividends
+from strategy.models import AssetCandidates, AssetData, AssetDividend, CheckAssets, DividendCalendar, Settings
+from strategy.money import NANO
+from strategy.portfolio import Portfolio
+
+CLASS_CODES = ['TQBR', 'SPBXM']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Замер времени поиска по горячим столбцам на синтетических данных (данные не сохраняются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--instruments',
+            type=int,
+            default=10_000,
+            help='Количество синтетических акций'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1_000,
+            help='Количество синтетических пользователей'
+        )
+        parser.add_argument(
+            '--assets-per-user',
+            type=int,
+            default=20,
+            help='Количество акций в портфеле и дивидендах каждого пользователя'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Количество повторов каждого запроса'
+        )
+
+    def populate(self, instruments, users, assets_per_user):
+        today = date.today()
+        tickers = [f'T{i:05d}' for i in range(instruments // len(CLASS_CODES) + 1)]
+        AssetData.objects.bulk_create(
+            [
+                AssetData(
+                    figi=f'BENCH{i:07d}',
+                    ticker=tickers[i // len(CLASS_CODES)],
+                    class_code=CLASS_CODES[i % len(CLASS_CODES)],
+                    price=(100 + i % 900) * NANO,
+                    logo_url='',
+                )
+                for i in range(instruments)
+            ],
+            batch_size=1000
+        )
+        DividendCalendar.objects.bulk_create(
+            [
+                DividendCalendar(
+                    figi=f'BENCH{i:07d}',
+                    ticker=ticker,
+                    company_name=ticker,
+                    payday=today + timedelta(days=i % 365),
+                    dividend=10 * NANO,
+                    updated_at=timezone.now(),
+                )
+                for i, ticker in enumerate(tickers)
+            ],
+            batch_size=1000
+        )
+
+        # bulk_create не вызывает сигналы, поэтому настройки создаются явно
+        User.objects.bulk_create([User(username=f'benchmark_{i}') for i in range(users)], batch_size=1000)
+        owners = list(User.objects.filter(username__startswith='benchmark_'))
+        Settings.objects.bulk_create(
+            [
+                Settings(
+                    available_capital=100_000,
+                    broker_commission=0.05,
+                    dividend_tax=13,
+                    central_bank_rate=0.165,
+                    dividends_from_date=today,
+                    dividends_to_date=today + timedelta(days=90),
+                    tg_id=0,
+                    owner=owner,
+                )
+                for owner in owners
+            ],
+            batch_size=1000
+        )
+
+        check_assets = []
+        dividends = []
+        candidates = []
+        for owner in owners:
+            for ticker in random.sample(tickers, min(assets_per_user, len(tickers))):
+                check_assets.append(CheckAssets(
+                    ticker=ticker, buy_price=100 * NANO, buy_count=1, current_price=100 * NANO,
+                    excepted_price=110 * NANO, owner=owner
+                ))
+                dividends.append(AssetDividend(ticker=ticker, priority=3, max_part=10, owner=owner))
+                candidates.append(AssetCandidates(
+                    ticker=ticker, price=100 * NANO, count=1, costs=100 * NANO, share=1, dividend=10 * NANO, owner=owner
+                ))
+        CheckAssets.objects.bulk_create(check_assets, batch_size=1000)
+        AssetDividend.objects.bulk_create(dividends, batch_size=1000)
+        AssetCandidates.objects.bulk_create(candidates, batch_size=1000)
+
+        return tickers, owners
+
+    def measure(self, name, make_query, repeat):
+        """Медиана и 95-й перцентиль времени выполнения запроса и его план"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = make_query()
+            if hasattr(result, '_fetch_all'):
+                list(result)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(f"{name}: медиана {statistics.median(timings):.3f} мс, p95 {p95:.3f} мс"))
+
+        query = make_query()
+        if hasattr(query, 'explain'):
+            for line in query.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                tickers, owners = self.populate(options['instruments'], options['users'], options['assets_per_user'])
+                self.stdout.write(
+                    f"Создано {options['instruments']} акций и {len(owners)} пользователей "
+                    f"за {time.perf_counter() - started:.1f} с"
+                )
+
+                self.measure(
+                    "AssetData по тикеру",
+                    lambda: AssetData.objects.filter(ticker=random.choice(tickers)).order_by('pk')[:1],
+                    repeat
+                )
+                self.measure(
+                    "AssetData по FIGI",
+                    lambda: AssetData.objects.filter(figi=f'BENCH{random.randrange(options["instruments"]):07d}'),
+                    repeat
+                )
+                self.measure(
+                    "CheckAssets по владельцу",
+                    lambda: CheckAssets.objects.filter(owner=random.choice(owners)),
+                    repeat
+                )
+                self.measure(
+                    "CheckAssets по владельцу и тикеру",
+                    lambda: CheckAssets.objects.filter(owner=random.choice(owners), ticker=random.choice(tickers)),
+                    repeat
+                )
+                self.measure(
+                    "AssetCandidates по владельцу",
+                    lambda: AssetCandidates.objects.filter(owner=random.choice(owners), count__gt=0),
+                    repeat
+                )
+                self.measure(
+                    "DividendCalendar по периоду отсечки",
+                    lambda: DividendCalendar.objects.filter(
+                        payday__range=(date.today(), date.today() + timedelta(days=30))
+                    ),
+                    repeat
+                )
+                self.measure(
+                    "Портфель пользователя",
+                    lambda: Portfolio.load(CheckAssets.objects.filter(owner=random.choice(owners))),
+                    repeat
+                )
+                settings_list = list(Settings.objects.filter(owner__in=owners[:1]))
+                self.measure(
+                    "Дивиденды пользователя",
+                    lambda: load_user_dividends(settings_list),
+                    max(repeat // 10, 1)
+                )
+
+                raise Rollback
+        except Rollback:
+            self.stdout.write("Синтетические данные удалены")
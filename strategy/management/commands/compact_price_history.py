@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from strategy.price_history import compact_history, RAW_RETENTION_DAYS, DAILY_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = "Свертка истории цен в дневные OHLC и удаление устаревших данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--raw-days',
+            type=int,
+            default=RAW_RETENTION_DAYS,
+            help='Количество дней, за которые хранятся все снимки цен'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=DAILY_RETENTION_DAYS,
+            help='Количество дней, за которые хранятся дневные цены'
+        )
+
+    def handle(self, *args, **options):
+        daily_count, raw_deleted, daily_deleted = compact_history(options['raw_days'], options['retention_days'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Записано {daily_count} дневных цен, удалено {raw_deleted} снимков и {daily_deleted} устаревших дневных цен"
+            )
+        )
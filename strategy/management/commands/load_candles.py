@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management import BaseCommand
+from t_tech.invest import AsyncClient, CandleInterval
+from t_tech.invest.constants import INVEST_GRPC_API_SANDBOX
+
+from strategy.api import wait_api_limit
+from strategy.candles import CandleCache, candles_to_array, split_period, to_datetime
+from strategy.catalog import find_instruments
+
+
+class Command(BaseCommand):
+    help = "Загрузка исторических дневных свечей в локальный кеш"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tickers',
+            nargs='+',
+            required=True,
+            help='Тикеры акций'
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            type=date.fromisoformat,
+            required=True,
+            help='Начало периода (ГГГГ-ММ-ДД)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            type=date.fromisoformat,
+            default=None,
+            help='Конец периода включительно (ГГГГ-ММ-ДД), по умолчанию сегодня'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=5,
+            help='Максимальное количество одновременных запросов к API'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token = os.getenv('TOKEN', '')
+
+    def log_warning(self, message):
+        self.stdout.write(self.style.WARNING(message))
+
+    async def get_candles(self, client, semaphore, figi, start, end):
+        async with semaphore:
+            await wait_api_limit(self.log_warning)
+            response = await client.market_data.get_candles(
+                figi=figi,
+                from_=to_datetime(start),
+                to=to_datetime(end),
+                interval=CandleInterval.CANDLE_INTERVAL_DAY
+            )
+
+        return candles_to_array(response.candles)
+
+    async def load_instrument(self, client, semaphore, instrument, start, end):
+        """Загрузка недостающих периодов одного инструмента"""
+        cache = CandleCache(instrument.figi)
+        gaps = [chunk for gap in cache.missing(start, end) for chunk in split_period(*gap)]
+
+        if not gaps:
+            return 0, len(cache.read())
+
+        candles = await asyncio.gather(
+            *(self.get_candles(client, semaphore, instrument.figi, chunk_start, chunk_end) for chunk_start, chunk_end in gaps)
+        )
+        # Текущий день еще не завершен и будет догружен при следующем запуске
+        today = date.today()
+        periods = [(chunk_start, min(chunk_end, today)) for chunk_start, chunk_end in gaps if chunk_start < today]
+        total = cache.merge(np.concatenate(candles), periods)
+
+        return len(gaps), total
+
+    async def load(self, tickers, start, end, concurrency):
+        async with AsyncClient(self.token, target=INVEST_GRPC_API_SANDBOX) as client:
+            instruments = await find_instruments(client, tickers, log=self.log_warning)
+
+            for ticker in sorted(set(tickers) - set(instruments)):
+                self.stdout.write(self.style.ERROR(f"Тикер {ticker} не найден в справочнике"))
+
+            semaphore = asyncio.Semaphore(concurrency)
+            results = await asyncio.gather(
+                *(self.load_instrument(client, semaphore, instrument, start, end) for instrument in instruments.values()),
+                return_exceptions=True
+            )
+
+            return [(instrument.ticker, result) for instrument, result in zip(instruments.values(), results)]
+
+    def handle(self, *args, **options):
+        if not self.token:
+            self.stdout.write(self.style.ERROR("TOKEN не найден в переменных окружения"))
+            return
+
+        start = options['date_from']
+        # Дата по умолчанию вычисляется при запуске, а не при импорте модуля
+        end = (options['date_to'] or date.today()) + timedelta(days=1)
+        results = asyncio.run(self.load(options['tickers'], start, end, max(options['concurrency'], 1)))
+
+        for ticker, result in results:
+            if isinstance(result, Exception):
+                self.stdout.write(self.style.ERROR(f"Ошибка при загрузке свечей {ticker}: {result}"))
+                continue
+
+            requests_count, total = result
+            self.stdout.write(f"{ticker}: загружено периодов {requests_count}, свечей в кеше {total}")
@@ -0,0 +1,114 @@
+import asyncio
+import statistics
+import time
+
+import aiohttp
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = "Нагрузочный тест страниц чтения: запросы в секунду и задержки (WSGI или ASGI сервер)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Адрес запущенного сервера'
+        )
+        parser.add_argument(
+            '--paths',
+            nargs='+',
+            default=['/', '/dividend_stocks', '/candidates/'],
+            help='Страницы, которые запрашиваются по кругу'
+        )
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            required=True,
+            help='ID пользователя, от имени которого выполняются запросы'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Количество одновременных клиентов'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность теста в секундах'
+        )
+
+    def get_session_cookie(self, user_id):
+        """Сессия пользователя, созданная без пароля через тестовый клиент Django"""
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+
+        client = Client()
+        client.force_login(user)
+
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def worker(self, session, urls, deadline, timings, errors):
+        index = 0
+
+        while time.perf_counter() < deadline:
+            url = urls[index % len(urls)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                async with session.get(url, allow_redirects=False) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors.append(response.status)
+                        continue
+            except aiohttp.ClientError as e:
+                errors.append(type(e).__name__)
+                continue
+
+            timings.append((time.perf_counter() - started) * 1000)
+
+    async def run(self, urls, cookie, concurrency, duration):
+        timings = []
+        errors = []
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        cookies = {settings.SESSION_COOKIE_NAME: cookie}
+
+        async with aiohttp.ClientSession(connector=connector, cookies=cookies) as session:
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(
+                *(self.worker(session, urls, deadline, timings, errors) for _ in range(concurrency))
+            )
+            elapsed = time.perf_counter() - started
+
+        return timings, errors, elapsed
+
+    def handle(self, *args, **options):
+        cookie = self.get_session_cookie(options['user_id'])
+        if cookie is None:
+            self.stdout.write(self.style.ERROR(f"Пользователь с ID {options['user_id']} не найден"))
+            return
+
+        urls = [options['url'].rstrip('/') + path for path in options['paths']]
+        concurrency = max(options['concurrency'], 1)
+        timings, errors, elapsed = asyncio.run(self.run(urls, cookie, concurrency, options['duration']))
+
+        if not timings:
+            self.stdout.write(self.style.ERROR(f"Нет успешных запросов, ошибок: {len(errors)}"))
+            return
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(timings) / elapsed:.1f} запросов/с при {concurrency} клиентах: "
+            f"медиана {statistics.median(timings):.1f} мс, p95 {p95:.1f} мс"
+        ))
+        if errors:
+            self.stdout.write(self.style.WARNING(f"Ошибок: {len(errors)} ({', '.join(map(str, set(errors)))})"))
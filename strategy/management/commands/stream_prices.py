@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management import BaseCommand
+from t_tech.invest import AsyncClient, InstrumentStatus, LastPriceInstrument
+from t_tech.invest.constants import INVEST_GRPC_API_SANDBOX
+
+from strategy.api import wait_api_limit
+from strategy.catalog import find_instruments
+from strategy.models import AssetData, CheckAssets, DividendCalendar
+from strategy.money import quotation_to_nano
+from strategy.notifications import notify
+from strategy.portfolio import update_current_prices
+from strategy.price_history import record_prices
+from strategy.price_snapshot import bump_version, update_snapshot
+
+
+class Command(BaseCommand):
+    help = "Потоковое обновление цен отслеживаемых акций"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=5,
+            help='Период записи накопленных цен в базу (сек.)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=60,
+            help='Период опроса цен, пока поток недоступен (сек.)'
+        )
+        parser.add_argument(
+            '--resubscribe-interval',
+            type=float,
+            default=300,
+            help='Период проверки списка отслеживаемых акций (сек.)'
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token = os.getenv('TOKEN', '')
+        self.pending = {}
+
+    def log_warning(self, message):
+        self.stdout.write(self.style.WARNING(message))
+
+    @staticmethod
+    def get_tracked_tickers():
+        """Тикеры, присутствующие в портфелях пользователей или календаре дивидендов"""
+        tickers = set(CheckAssets.objects.values_list('ticker', flat=True))
+        tickers.update(DividendCalendar.objects.values_list('ticker', flat=True))
+
+        return tickers
+
+    async def get_tracked_instruments(self, client):
+        tickers = await sync_to_async(self.get_tracked_tickers)()
+        instruments = await find_instruments(client, tickers, log=self.log_warning)
+
+        return {instrument.figi: instrument for instrument in instruments.values()}
+
+    @staticmethod
+    def save_prices(instruments, prices):
+        """Запись цен в AssetData и пересчет сигналов по изменившимся акциям"""
+        prices = {figi: price for figi, price in prices.items() if figi in instruments}
+        assets_to_update = []
+
+        for asset in AssetData.objects.filter(figi__in=prices):
+            price = quotation_to_nano(prices[asset.figi])
+            if asset.price != price:
+                asset.price = price
+                assets_to_update.append(asset)
+
+        if assets_to_update:
+            AssetData.objects.bulk_update(assets_to_update, ['price'])
+            record_prices(assets_to_update)
+            if update_snapshot({asset.ticker for asset in assets_to_update}) is None:
+                # Снимка нет: страницы читают цены из базы, но кеш страниц нужно сбросить
+                bump_version()
+            update_current_prices()
+            notify()
+
+        return len(assets_to_update)
+
+    async def flush(self, instruments):
+        """Запись накопленных с прошлой записи цен одним пакетом"""
+        if not self.pending:
+            return
+
+        prices, self.pending = self.pending, {}
+        try:
+            updated_count = await sync_to_async(self.save_prices)(instruments, prices)
+        except Exception:
+            # Цены возвращаются в очередь, более новые цены из потока имеют приоритет
+            self.pending = {**prices, **self.pending}
+            raise
+        if updated_count:
+            self.stdout.write(f"Обновлено цен: {updated_count}")
+
+    async def flush_periodically(self, client, market_data_stream, instruments, options):
+        """Периодическая запись цен и переподписка при изменении списка акций
+
+        Ошибки записи и проверки списка акций только логируются: задачу никто не
+        ожидает, и ее остановка молча прекратила бы запись цен до перезапуска.
+        """
+        checked_at = time.monotonic()
+
+        while True:
+            await asyncio.sleep(options['flush_interval'])
+            try:
+                await self.flush(instruments)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Ошибка при записи цен: {e}"))
+
+            if time.monotonic() - checked_at >= options['resubscribe_interval']:
+                checked_at = time.monotonic()
+                try:
+                    tracked = await self.get_tracked_instruments(client)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Ошибка при проверке списка акций: {e}"))
+                    continue
+
+                if set(tracked) != set(instruments):
+                    self.stdout.write("Список отслеживаемых акций изменился, переподписка...")
+                    market_data_stream.stop()
+                    return
+
+    async def stream(self, client, instruments, options):
+        market_data_stream = client.create_market_data_stream()
+        market_data_stream.last_price.subscribe([LastPriceInstrument(figi=figi) for figi in instruments])
+        flusher = asyncio.create_task(self.flush_periodically(client, market_data_stream, instruments, options))
+        self.stdout.write(self.style.SUCCESS(f"Подписка на цены {len(instruments)} акций"))
+
+        try:
+            async for marketdata in market_data_stream:
+                if marketdata.last_price:
+                    self.pending[marketdata.last_price.figi] = marketdata.last_price.price
+        finally:
+            flusher.cancel()
+            market_data_stream.stop()
+
+        await self.flush(instruments)
+
+    async def poll(self, client, instruments):
+        """Разовый опрос последних цен на время недоступности потока"""
+        await wait_api_limit(self.log_warning)
+        result = await client.market_data.get_last_prices(
+            figi=list(instruments),
+            instrument_status=InstrumentStatus.INSTRUMENT_STATUS_ALL,
+        )
+        for price in result.last_prices:
+            self.pending[price.figi] = price.price
+
+        await self.flush(instruments)
+
+    async def run(self, options):
+        async with AsyncClient(self.token, target=INVEST_GRPC_API_SANDBOX) as client:
+            while True:
+                instruments = await self.get_tracked_instruments(client)
+
+                if not instruments:
+                    self.log_warning("Нет отслеживаемых акций")
+                    await asyncio.sleep(options['resubscribe_interval'])
+                    continue
+
+                try:
+                    await self.stream(client, instruments, options)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Поток цен недоступен: {e}. Переход на опрос"))
+                    try:
+                        await self.poll(client, instruments)
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f"Ошибка при опросе цен: {e}"))
+                    await asyncio.sleep(options['poll_interval'])
+
+    def handle(self, *args, **options):
+        if not self.token:
+            self.stdout.write(self.style.ERROR("TOKEN не найден в переменных окружения"))
+            return
+
+        try:
+            asyncio.run(self.run(options))
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлено")
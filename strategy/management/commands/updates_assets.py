@@ -1,18 +1,39 @@
 import asyncio
+import math
 import ssl
 import os
 from typing import List
 
-import requests
-from django.conf import settings
-from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.management import BaseCommand
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from grpc import StatusCode
+from redis.exceptions import RedisError
 from t_tech.invest import AsyncClient, InstrumentStatus
 from t_tech.invest.constants import INVEST_GRPC_API_SANDBOX
-
-from strategy.models import AssetData, CheckAssets, Settings
+from t_tech.invest.exceptions import AioRequestError
+
+from strategy.api import wait_api_limit
+from strategy.catalog import get_instruments
+from strategy.models import AssetData, CheckAssets
+from strategy.money import quotation_to_nano
+from strategy.notifications import notify
+from strategy.portfolio import update_current_prices
+from strategy.price_history import record_prices
+from strategy.price_snapshot import bump_version, publish_snapshot
+
+MAX_BATCH_SIZE = 1000  # Верхняя граница FIGI в одном запросе get_last_prices
+# Размер батча, который API принял после отказа, используется следующими запусками
+BATCH_SIZE_KEY = 'updates_assets:batch_size'
+BATCH_SIZE_TIMEOUT = 24 * 3600
+MAX_ATTEMPTS = 4
+SYNC_FIELDS = ['figi', 'ticker', 'class_code', 'price', 'logo_url', 'lot', 'min_price_increment']
+TRANSIENT_STATUS_CODES = {
+    StatusCode.UNAVAILABLE,
+    StatusCode.DEADLINE_EXCEEDED,
+    StatusCode.RESOURCE_EXHAUSTED,
+    StatusCode.INTERNAL,
+}
 
 
 class Command(BaseCommand):
@@ -21,39 +42,117 @@ class Command(BaseCommand):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.token = os.getenv('TOKEN', '')
-        self.batch_size = 50  # Оптимальный размер батча для запросов
+        self.batch_size = MAX_BATCH_SIZE
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Полная перезагрузка таблицы вместо инкрементального обновления'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Максимальное количество одновременных запросов цен'
+        )
+        parser.add_argument(
+            '--max-batch-size',
+            type=int,
+            default=MAX_BATCH_SIZE,
+            help='Максимальное количество FIGI в одном запросе цен'
+        )
+
+    def log_warning(self, message):
+        self.stdout.write(self.style.WARNING(message))
+
+    async def request_prices(self, client, semaphore, figi_list: List[str]) -> dict:
+        """Запрос цен батча с повтором при временных ошибках API"""
+        delay = 1
+
+        for attempt in range(MAX_ATTEMPTS):
+            async with semaphore:
+                await wait_api_limit(self.log_warning)
+                try:
+                    result = await client.market_data.get_last_prices(
+                        figi=figi_list,
+                        instrument_status=InstrumentStatus.INSTRUMENT_STATUS_ALL,
+                    )
+                    return {price.figi: price.price for price in result.last_prices}
+                except AioRequestError as e:
+                    if e.code not in TRANSIENT_STATUS_CODES or attempt == MAX_ATTEMPTS - 1:
+                        raise
 
-    async def get_all_assets(self) -> List:
-        """Получение всех активов"""
-        async with AsyncClient(self.token, target=INVEST_GRPC_API_SANDBOX) as client:
-            api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            while api_request_counter >= 190:
-                wait_time = 10
-                await asyncio.sleep(wait_time)
-                self.stdout.write(self.style.WARNING(f"Большое количество запросов ({api_request_counter}). Повторный запрос через {wait_time} секунд"))
-                api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            response = await client.instruments.shares()
-            cache.incr('API_REQUESTS_COUNTER')
-        return response.instruments
-
-    async def get_asset_values_batch(self, figi_list: List[str]) -> dict:
-        """Получение цен для батча активов"""
-        async with AsyncClient(self.token, target=INVEST_GRPC_API_SANDBOX) as client:
-            api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            while api_request_counter >= 190:
-                wait_time = 10
-                await asyncio.sleep(wait_time)
-                self.stdout.write(self.style.WARNING(f"Большое количество запросов ({api_request_counter}). Повторный запрос через {wait_time} секунд"))
-                api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            result = await client.market_data.get_last_prices(
-                figi=figi_list,
-                instrument_status=InstrumentStatus.INSTRUMENT_STATUS_ALL,
-            )
-            cache.incr('API_REQUESTS_COUNTER')
-        return {price.figi: price.price for price in result.last_prices}
+            self.log_warning(f"Временная ошибка API, повтор батча через {delay} секунд")
+            await asyncio.sleep(delay)
+            delay *= 2
 
-    async def process_assets(self, assets: List) -> List[AssetData]:
-        """Асинхронная обработка активов с батчингом"""
+    async def get_asset_values_batch(self, client, semaphore, figi_list: List[str]) -> dict:
+        """Получение цен для батча; отклоненный API батч проверяется по половинам"""
+        try:
+            return await self.request_prices(client, semaphore, figi_list)
+        except AioRequestError as e:
+            if e.code != StatusCode.INVALID_ARGUMENT:
+                raise
+            return await self.split_rejected_batch(client, semaphore, figi_list, e)
+
+    async def split_rejected_batch(self, client, semaphore, figi_list: List[str], error) -> dict:
+        """Цены отклоненного батча по половинам
+
+        Если приняты обе половины, API отклонил размер батча, и принятый размер
+        запоминается для следующих запусков. Если отклонена одна половина, дело
+        в ее содержимом: она делится дальше до отдельного FIGI, который пропускается.
+        Если отклонены обе, деление не помогает, и ошибка передается вызывающему.
+        """
+        if len(figi_list) == 1:
+            self.log_warning(f"FIGI {figi_list[0]} отклонен API ({error.code.name}), цена не обновлена")
+            return {}
+
+        half = len(figi_list) // 2
+        parts = [figi_list[:half], figi_list[half:]]
+        results = await asyncio.gather(
+            *(self.request_prices(client, semaphore, part) for part in parts),
+            return_exceptions=True
+        )
+        rejected = [
+            isinstance(result, AioRequestError) and result.code == StatusCode.INVALID_ARGUMENT for result in results
+        ]
+
+        if all(rejected):
+            raise error
+        if not any(rejected):
+            # Размер сохраняется только после того, как API вернул цены для батча такого размера
+            await self.save_batch_size(len(parts[1]))
+            self.log_warning(f"Батч из {len(figi_list)} FIGI отклонен ({error.code.name}), размер уменьшен до {len(parts[1])}")
+
+        prices = {}
+        for part, result, is_rejected in zip(parts, results, rejected):
+            if is_rejected:
+                result = await self.split_rejected_batch(client, semaphore, part, result)
+            elif isinstance(result, Exception):
+                raise result
+            prices.update(result)
+
+        return prices
+
+    @staticmethod
+    async def load_batch_size():
+        try:
+            return await cache.aget(BATCH_SIZE_KEY)
+        except RedisError:
+            return None
+
+    @staticmethod
+    async def save_batch_size(batch_size):
+        try:
+            learned = await cache.aget(BATCH_SIZE_KEY)
+            if learned is None or batch_size < learned:
+                await cache.aset(BATCH_SIZE_KEY, batch_size, BATCH_SIZE_TIMEOUT)
+        except RedisError:
+            pass
+
+    async def process_assets(self, client, assets: List, concurrency: int) -> List[AssetData]:
+        """Асинхронная обработка активов параллельными батчами через одно соединение"""
         assets_to_add = []
         figi_to_asset = {}
 
@@ -66,71 +165,138 @@ class Command(BaseCommand):
             figi_list.append(asset.figi)
             figi_to_asset[asset.figi] = asset
 
-        # Обрабатываем батчами
-        for i in range(0, len(figi_list), self.batch_size):
-            batch_figi = figi_list[i:i + self.batch_size]
-
-            try:
-                # Получаем цены для батча
-                prices = await self.get_asset_values_batch(batch_figi)
-
-                # Обрабатываем каждый актив в батче
-                for figi in batch_figi:
-                    if figi not in figi_to_asset:
-                        continue
-
-                    asset = figi_to_asset[figi]
-                    price = prices.get(figi)
-
-                    if not price:
-                        self.stdout.write(
-                            self.style.WARNING(f"Цена не найдена для {asset.ticker}")
-                        )
-                        continue
-
-                    # Создаем объект AssetData
-                    logo_url = None
-                    if asset.brand and asset.brand.logo_name:
-                        logo_url = f'https://invest-brands.cdn-tinkoff.ru/{asset.brand.logo_name[:-4]}x160.png'
-
-                    assets_to_add.append(AssetData(
-                        ticker=asset.ticker,
-                        class_code=asset.class_code,
-                        nano=price.nano,
-                        units=price.units,
-                        logo_url=logo_url
-                    ))
-
-            except Exception as e:
+        # Размер батча подбирается так, чтобы все батчи ушли за одну волну запросов,
+        # и не превышает размер, который API принял после отказа в прошлых запусках
+        learned_batch_size = await self.load_batch_size()
+        if learned_batch_size:
+            self.batch_size = min(self.batch_size, learned_batch_size)
+        self.batch_size = min(self.batch_size, max(1, math.ceil(len(figi_list) / concurrency)))
+        batches = [figi_list[i:i + self.batch_size] for i in range(0, len(figi_list), self.batch_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(
+            *(self.get_asset_values_batch(client, semaphore, batch_figi) for batch_figi in batches),
+            return_exceptions=True
+        )
+
+        for i, (batch_figi, prices) in enumerate(zip(batches, results)):
+            if isinstance(prices, Exception):
                 self.stdout.write(
-                    self.style.ERROR(f"Ошибка при обработке батча {i}: {e}")
+                    self.style.ERROR(f"Ошибка при обработке батча {i}: {prices}")
                 )
                 # Продолжаем обработку следующих батчей
+                continue
+
+            # Обрабатываем каждый актив в батче
+            for figi in batch_figi:
+                asset = figi_to_asset[figi]
+                price = prices.get(figi)
+
+                if not price:
+                    self.stdout.write(
+                        self.style.WARNING(f"Цена не найдена для {asset.ticker}")
+                    )
+                    continue
+
+                # Создаем объект AssetData
+                assets_to_add.append(AssetData(
+                    figi=figi,
+                    ticker=asset.ticker,
+                    class_code=asset.class_code,
+                    price=quotation_to_nano(price),
+                    logo_url=asset.logo_url,
+                    lot=asset.lot,
+                    min_price_increment=asset.min_price_increment
+                ))
 
         return assets_to_add
 
-    @staticmethod
-    def notifier():
-        assets = CheckAssets.objects.all()
+    async def collect_assets(self, concurrency: int) -> tuple:
+        """Получение справочника и цен через одно соединение с API"""
+        async with AsyncClient(self.token, target=INVEST_GRPC_API_SANDBOX) as client:
+            # Получаем все активы
+            self.stdout.write("Получение списка акций...")
+            assets = await get_instruments(client, log=self.log_warning)
 
+            if not assets:
+                return assets, []
+
+            self.stdout.write(f"Найдено {len(assets)} акций")
+
+            # Обрабатываем активы
+            self.stdout.write("Получение цен и обработка данных...")
+            return assets, await self.process_assets(client, assets, concurrency)
+
+    @staticmethod
+    def unique_assets(assets: List[AssetData]) -> List[AssetData]:
+        """Первая запись для каждой пары (тикер, секция торгов)"""
+        unique = {}
         for asset in assets:
-            if asset.get_is_can_sold() or asset.get_is_danger():
-                chat_id = Settings.objects.filter(owner=get_object_or_404(User, pk=asset.owner.pk)).first().tg_id
-                if chat_id:
-                    params = {
-                        "chat_id": chat_id,
-                        "text": f'Акцию {asset.ticker} можно продать!',
-                    }
-
-                    request = requests.get(
-                        f"https://{settings.TELEGRAM_URL}bot{settings.TELEGRAM_TOKEN}/sendMessage", params=params
-                    )
-                    if request.status_code == 200:
-                        asset.is_notified = True
-                        asset.save()
-            elif asset.is_notified:
-                    asset.is_notified = False
-                    asset.save()
+            unique.setdefault((asset.ticker, asset.class_code), asset)
+
+        return list(unique.values())
+
+    def sync_assets(self, assets_to_add: List[AssetData], listed_figis: set) -> tuple:
+        """Инкрементальное обновление AssetData по FIGI
+
+        Обновляются только изменившиеся данные, новые инструменты добавляются,
+        удаляются только инструменты, пропавшие из справочника, и дубликаты.
+        Записи без FIGI сопоставляются по (тикер, секция торгов).
+        """
+        assets_to_add = self.unique_assets(assets_to_add)
+        figi_by_key = {(asset.ticker, asset.class_code): asset.figi for asset in assets_to_add}
+        existing = {}
+        stale_pks = []
+
+        for asset in AssetData.objects.order_by('pk'):
+            figi = asset.figi or figi_by_key.get((asset.ticker, asset.class_code))
+            if figi not in listed_figis or figi in existing:
+                stale_pks.append(asset.pk)
+            else:
+                existing[figi] = asset
+
+        assets_to_update = []
+        assets_to_create = []
+        renamed_pks = []
+
+        for asset in assets_to_add:
+            current = existing.get(asset.figi)
+
+            if current is None:
+                assets_to_create.append(asset)
+            elif any(getattr(current, field) != getattr(asset, field) for field in SYNC_FIELDS):
+                if (current.ticker, current.class_code) != (asset.ticker, asset.class_code):
+                    renamed_pks.append(current.pk)
+                for field in SYNC_FIELDS:
+                    setattr(current, field, getattr(asset, field))
+                assets_to_update.append(current)
+
+        with transaction.atomic():
+            # Удаление до записи, чтобы освободить (тикер, секция торгов) для переименованных инструментов
+            deleted_count, _ = AssetData.objects.filter(pk__in=stale_pks).delete()
+            # Переименованные инструменты сначала получают временную секцию по pk: при обмене
+            # тикерами уникальность (тикер, секция торгов) иначе нарушилась бы посреди UPDATE
+            AssetData.objects.bulk_update(
+                [AssetData(pk=pk, class_code=f'~{pk}') for pk in renamed_pks], ['class_code']
+            )
+            updated_count = AssetData.objects.bulk_update(assets_to_update, SYNC_FIELDS, batch_size=500)
+            created_count = len(AssetData.objects.bulk_create(assets_to_create))
+            # В историю попадают только новые и изменившиеся цены
+            record_prices(assets_to_update + assets_to_create)
+
+        return updated_count, created_count, deleted_count
+
+    def publish_prices(self):
+        version = publish_snapshot()
+        if version is None:
+            self.stdout.write(self.style.WARNING("Снимок цен не опубликован: Redis недоступен"))
+        else:
+            self.stdout.write(f"Опубликован снимок цен, версия {version}")
+
+    def notifier(self):
+        chats_count, notified_count, reset_count = notify()
+        self.stdout.write(
+            f"Отправлено {chats_count} сводок по {notified_count} акциям, сброшено {reset_count} уведомлений"
+        )
 
     def handle(self, *args, **options):
         # Отключаем проверку SSL для избежания проблем с сертификатами
@@ -143,38 +309,41 @@ class Command(BaseCommand):
         self.stdout.write("Начало обновления базы акций...")
 
         try:
-            # Получаем все активы
-            self.stdout.write("Получение списка акций...")
-            assets = asyncio.run(self.get_all_assets())
+            self.batch_size = max(options['max_batch_size'], 1)
+            assets, assets_to_add = asyncio.run(self.collect_assets(max(options['concurrency'], 1)))
 
             if not assets:
                 self.stdout.write(self.style.WARNING("Активы не найдены"))
                 return
 
-            self.stdout.write(f"Найдено {len(assets)} акций")
-
-            # Обрабатываем активы
-            self.stdout.write("Получение цен и обработка данных...")
-            assets_to_add = asyncio.run(self.process_assets(assets))
-
             # Обновляем базу данных
             self.stdout.write("Обновление базы данных...")
 
-            # Используем транзакцию для атомарности
-            from django.db import transaction
-
-            with transaction.atomic():
-                # Удаляем старые данные
-                deleted_count, _ = AssetData.objects.all().delete()
-                self.stdout.write(f"Удалено {deleted_count} старых записей")
-
-                # Добавляем новые данные
-                created_count = len(AssetData.objects.bulk_create(assets_to_add))
-                self.stdout.write(f"Добавлено {created_count} новых записей")
+            if options['full']:
+                with transaction.atomic():
+                    # Удаляем старые данные
+                    deleted_count, _ = AssetData.objects.all().delete()
+                    self.stdout.write(f"Удалено {deleted_count} старых записей")
+
+                    # Добавляем новые данные
+                    assets_to_add = self.unique_assets(assets_to_add)
+                    created_count = len(AssetData.objects.bulk_create(assets_to_add))
+                    self.stdout.write(f"Добавлено {created_count} новых записей")
+                    record_prices(assets_to_add)
+            else:
+                listed_figis = {asset.figi for asset in assets}
+                updated_count, created_count, deleted_count = self.sync_assets(assets_to_add, listed_figis)
+                self.stdout.write(
+                    f"Изменено {updated_count}, добавлено {created_count}, удалено {deleted_count} записей"
+                )
 
             self.stdout.write(
-                self.style.SUCCESS(f"База акций успешно обновлена! Всего записей: {created_count}")
+                self.style.SUCCESS(f"База акций успешно обновлена! Всего записей: {AssetData.objects.count()}")
             )
+            self.publish_prices()
+            update_current_prices()
             self.notifier()
+            # Сброс кеша страниц после пересчета текущих цен позиций
+            bump_version()
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Ошибка при выполнении команды: {e}"))
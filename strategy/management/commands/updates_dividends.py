@@ -3,100 +3,151 @@ import os
 from datetime import datetime, time
 
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.core.management import BaseCommand
 from django.shortcuts import get_object_or_404
 from t_tech.invest import AsyncClient
 from t_tech.invest.constants import INVEST_GRPC_API_SANDBOX
 
-from strategy.models import AssetData, Settings, AssetDividend
+from strategy.api import wait_api_limit
+from strategy.catalog import get_instruments
+from strategy.dividends import is_calendar_fresh, save_calendar
+from strategy.models import AssetData, DividendCalendar
+from strategy.money import quotation_to_nano
+from strategy.tasks import report_progress
+from strategy.user_settings import get_all_user_settings, get_user_settings
 
 
 class Command(BaseCommand):
-    help = "Обновление базы дивидендов"
+    help = "Обновление календаря дивидендов"
 
     def add_arguments(self, parser):
-        parser.add_argument(
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument(
             '--user-id',
             type=int,
             help='ID пользователя'
         )
+        group.add_argument(
+            '--all-users',
+            action='store_true',
+            help='Обновление за периоды отсечки всех пользователей'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Обновить календарь, даже если он недавно обновлялся'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Максимальное количество одновременных запросов к API'
+        )
 
-    async def get_all_assets(self, token):
-        async with AsyncClient(token, target=INVEST_GRPC_API_SANDBOX) as client:
-            api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            while api_request_counter >= 190:
-                wait_time = 10
-                await asyncio.sleep(wait_time)
-                self.stdout.write(
-                    self.style.WARNING(f"Большое количество запросов ({api_request_counter}). Повторный запрос через {wait_time} секунд"))
-                api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            response = await client.instruments.shares()
-            cache.incr('API_REQUESTS_COUNTER')
-        return response.instruments
+    def log_warning(self, message):
+        self.stdout.write(self.style.WARNING(message))
 
-    async def get_dividends(self, token, figi, date_from, date_to):
-        async with AsyncClient(token, target=INVEST_GRPC_API_SANDBOX) as client:
-            api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
-            while api_request_counter >= 190:
-                wait_time = 10
-                await asyncio.sleep(wait_time)
-                self.stdout.write(
-                    self.style.WARNING(
-                        f"Большое количество запросов ({api_request_counter}). Повторный запрос через {wait_time} секунд"))
-                api_request_counter = cache.get('API_REQUESTS_COUNTER', 0)
+    async def get_dividends(self, client, semaphore, figi, date_from, date_to):
+        async with semaphore:
+            await wait_api_limit(self.log_warning)
             response = await client.instruments.get_dividends(
                 figi=figi,
                 from_=date_from,
                 to=date_to
             )
-            cache.incr('API_REQUESTS_COUNTER')
+        self.done += 1
+        if self.done % 10 == 0 or self.done == self.total:
+            report_progress(self.done, self.total)
         return response.dividends
 
+    @staticmethod
+    async def get_prices():
+        """Загрузка цен всех акций одним запросом в виде словаря тикер -> цена в нано-рублях"""
+        prices = {}
+        async for ticker, price in AssetData.objects.order_by('pk').values_list('ticker', 'price'):
+            prices.setdefault(ticker, price)
+
+        return prices
+
+    async def collect_dividends(self, token, dt_from, dt_to, concurrency):
+        """Получение дивидендов по всем рублевым акциям через одно соединение с API"""
+        async with AsyncClient(token, target=INVEST_GRPC_API_SANDBOX) as client:
+            assets = await get_instruments(client, log=self.log_warning)
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Собрано {len(assets)} акций"))
+            prices = await self.get_prices()
+            figis = []
+            skipped = 0
+            for asset in assets:
+                curency = asset.currency
+                if curency != 'rub':
+                    continue
+                price = prices.get(asset.ticker)
+                if not price:
+                    skipped += 1
+                    continue
+                figis.append((asset.ticker, asset.figi, asset.name, price))
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Всего рублевых акций: {len(figis)}, пропущено без цены: {skipped}"))
+
+            self.done = 0
+            self.total = len(figis)
+            report_progress(self.done, self.total)
+            semaphore = asyncio.Semaphore(concurrency)
+            dividends = await asyncio.gather(
+                *(self.get_dividends(client, semaphore, figi[1], dt_from, dt_to) for figi in figis),
+                return_exceptions=True
+            )
+
+        return zip(figis, dividends)
+
     def handle(self, *args, **options):
-        user_id = options['user_id']
-        user = get_object_or_404(User, pk=user_id)
+        concurrency = max(options['concurrency'], 1)
         token = os.getenv('TOKEN', '')
-        assets = asyncio.run(self.get_all_assets(token))
-        self.stdout.write(
-            self.style.WARNING(
-                f"Собрано {len(assets)} акций"))
-        figis = []
-        dividends_to_add = []
-        date_from = Settings.objects.filter(owner=user).first().dividends_from_date
+        if options['all_users']:
+            settings_list = get_all_user_settings()
+        else:
+            user = get_object_or_404(User, pk=options['user_id'])
+            settings_list = [get_user_settings(user)]
+
+        if not settings_list:
+            self.stdout.write(self.style.WARNING("Нет пользователей с настройками"))
+            return
+
+        # Календарь общий для всех пользователей, поэтому запрашивается один раз за объединение периодов
+        date_from = min(user_settings.dividends_from_date for user_settings in settings_list)
+        date_to = max(user_settings.dividends_to_date for user_settings in settings_list)
+        if not options['force'] and is_calendar_fresh(date_from, date_to):
+            self.stdout.write(f"Календарь дивидендов с {date_from} по {date_to} актуален, обновление не требуется")
+            return
+
         dt_from = datetime.combine(date_from, time.min)
-        date_to = Settings.objects.filter(owner=user).first().dividends_to_date
         dt_to = datetime.combine(date_to, time.min)
-        for asset in assets:
-            price = AssetData.objects.filter(ticker=asset.ticker).first()
-            curency = asset.currency
-            if curency == 'rub':
-                figis.append((asset.ticker, asset.figi, asset.name, price.get_price()))
-        self.stdout.write(
-            self.style.WARNING(
-                f"Всего рублевых акций: {len(figis)}"))
-        counter = 0
-        for figi in figis:
-            dividend = asyncio.run(self.get_dividends(token, figi[1], dt_from, dt_to))
-            counter += 1
-            if dividend and dividend[0].dividend_net.currency == 'rub':
-                units = dividend[0].dividend_net.units
-                nano = dividend[0].dividend_net.nano
-                div_price = units + (nano / 1_000_000_000)
-                profitability = div_price / figi[3] * 100
-                check_date = dividend[0].last_buy_date.date()
-                if date_from <= check_date <= date_to:
-                    dividends_to_add.append(AssetDividend(
-                        ticker=figi[0],
-                        company_name=figi[2],
-                        payday=dividend[0].last_buy_date,
-                        dividend=div_price,
-                        profitability=profitability,
-                        price=figi[3],
-                        owner=user
-                    ))
+        results = asyncio.run(self.collect_dividends(token, dt_from, dt_to, concurrency))
+
+        calendar = {}
+        tickers = set()
+        for figi, dividends in results:
+            if isinstance(dividends, Exception):
+                self.stdout.write(
+                    self.style.ERROR(f"Ошибка при получении дивидендов {figi[0]}: {dividends}"))
+                continue
+            tickers.add(figi[0])
+            for dividend in dividends:
+                payday = dividend.last_buy_date.date()
+                if dividend.dividend_net.currency != 'rub' or not date_from <= payday <= date_to:
+                    continue
+                calendar.setdefault((figi[0], payday), DividendCalendar(
+                    figi=figi[1],
+                    ticker=figi[0],
+                    company_name=figi[2],
+                    payday=payday,
+                    dividend=quotation_to_nano(dividend.dividend_net)
+                ))
+
+        deleted = save_calendar(list(calendar.values()), tickers, date_from, date_to)
         self.stdout.write(
             self.style.WARNING(
-                f"Добавлено {len(dividends_to_add)} акций"))
-        AssetDividend.objects.filter(owner=user).all().delete()
-        AssetDividend.objects.bulk_create(dividends_to_add)
+                f"В календаре {len(calendar)} дивидендов с {date_from} по {date_to}, удалено отмененных: {deleted}"))
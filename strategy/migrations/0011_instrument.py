@@ -0,0 +1,30 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0010_assetcandidates_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('figi', models.CharField(max_length=20, unique=True, verbose_name='FIGI')),
+                ('ticker', models.CharField(max_length=10, verbose_name='Тикер')),
+                ('class_code', models.CharField(max_length=10, verbose_name='Секция торгов')),
+                ('currency', models.CharField(max_length=10, verbose_name='Валюта')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('logo_url', models.URLField(blank=True, null=True, verbose_name='URL логотипа')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Инструмент',
+                'verbose_name_plural': 'Справочник инструментов',
+            },
+        ),
+    ]
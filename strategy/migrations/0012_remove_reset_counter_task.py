@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def remove_reset_counter_task(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task='strategy.tasks.reset_counter').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0011_instrument'),
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_reset_counter_task, migrations.RunPython.noop),
+    ]
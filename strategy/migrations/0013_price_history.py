@@ -0,0 +1,46 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0012_remove_reset_counter_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10, verbose_name='Тикер')),
+                ('class_code', models.CharField(max_length=10, verbose_name='Секция торгов')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('open', models.BigIntegerField(verbose_name='Открытие (нано-руб.)')),
+                ('high', models.BigIntegerField(verbose_name='Максимум (нано-руб.)')),
+                ('low', models.BigIntegerField(verbose_name='Минимум (нано-руб.)')),
+                ('close', models.BigIntegerField(verbose_name='Закрытие (нано-руб.)')),
+            ],
+            options={
+                'verbose_name': 'Дневная цена',
+                'verbose_name_plural': 'Дневные цены',
+                'constraints': [models.UniqueConstraint(fields=('ticker', 'class_code', 'date'), name='unique_price_daily')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10, verbose_name='Тикер')),
+                ('class_code', models.CharField(max_length=10, verbose_name='Секция торгов')),
+                ('timestamp', models.DateTimeField(verbose_name='Время')),
+                ('price', models.BigIntegerField(verbose_name='Цена (нано-руб.)')),
+            ],
+            options={
+                'verbose_name': 'Цена',
+                'verbose_name_plural': 'История цен',
+                'indexes': [models.Index(fields=['ticker', 'timestamp'], name='strategy_pr_ticker_bd960e_idx')],
+            },
+        ),
+    ]
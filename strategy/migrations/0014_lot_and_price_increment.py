@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0013_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetdata',
+            name='lot',
+            field=models.IntegerField(default=1, verbose_name='Лотность'),
+        ),
+        migrations.AddField(
+            model_name='assetdata',
+            name='min_price_increment',
+            field=models.BigIntegerField(default=0, verbose_name='Шаг цены (нано-руб.)'),
+        ),
+        migrations.AddField(
+            model_name='instrument',
+            name='lot',
+            field=models.IntegerField(default=1, verbose_name='Лотность'),
+        ),
+        migrations.AddField(
+            model_name='instrument',
+            name='min_price_increment',
+            field=models.BigIntegerField(default=0, verbose_name='Шаг цены (нано-руб.)'),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def move_dividends_to_calendar(apps, schema_editor):
+    """Перенос дивидендов в общий календарь и удаление дублей настроек пользователей
+
+    Из дублей (владелец, тикер) остается самая новая запись с заполненным
+    приоритетом, а если приоритет не заполнен ни в одной — самая новая запись.
+    """
+    AssetDividend = apps.get_model('strategy', 'AssetDividend')
+    DividendCalendar = apps.get_model('strategy', 'DividendCalendar')
+    Instrument = apps.get_model('strategy', 'Instrument')
+
+    figis = dict(Instrument.objects.values_list('ticker', 'figi'))
+    updated_at = timezone.now()
+    calendar = {}
+    kept = {}
+
+    for dividend in AssetDividend.objects.order_by('pk'):
+        calendar.setdefault((dividend.ticker, dividend.payday), DividendCalendar(
+            figi=figis.get(dividend.ticker, ''),
+            ticker=dividend.ticker,
+            company_name=dividend.company_name,
+            payday=dividend.payday,
+            dividend=dividend.dividend,
+            updated_at=updated_at
+        ))
+        current = kept.get((dividend.owner_id, dividend.ticker))
+        if current is None or dividend.priority is not None or current.priority is None:
+            kept[(dividend.owner_id, dividend.ticker)] = dividend
+
+    kept_pks = {dividend.pk for dividend in kept.values()}
+    duplicates = [pk for pk in AssetDividend.objects.values_list('pk', flat=True) if pk not in kept_pks]
+
+    DividendCalendar.objects.bulk_create(calendar.values())
+    AssetDividend.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0014_lot_and_price_increment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DividendCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('figi', models.CharField(blank=True, max_length=20, verbose_name='FIGI')),
+                ('ticker', models.CharField(max_length=10, verbose_name='Тикер')),
+                ('company_name', models.CharField(max_length=255, verbose_name='Компания')),
+                ('payday', models.DateField(verbose_name='Дата отсечки')),
+                ('dividend', models.FloatField(verbose_name='Дивиденд (руб.)')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Дивиденд',
+                'verbose_name_plural': 'Календарь дивидендов',
+            },
+        ),
+        migrations.RunPython(move_dividends_to_calendar, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='assetdividend',
+            options={'verbose_name': 'Дивидендная акция пользователя', 'verbose_name_plural': 'Дивидендные акции пользователей'},
+        ),
+        migrations.RemoveField(
+            model_name='assetdividend',
+            name='company_name',
+        ),
+        migrations.RemoveField(
+            model_name='assetdividend',
+            name='dividend',
+        ),
+        migrations.RemoveField(
+            model_name='assetdividend',
+            name='payday',
+        ),
+        migrations.RemoveField(
+            model_name='assetdividend',
+            name='price',
+        ),
+        migrations.RemoveField(
+            model_name='assetdividend',
+            name='profitability',
+        ),
+        migrations.AddConstraint(
+            model_name='assetdividend',
+            constraint=models.UniqueConstraint(fields=('owner', 'ticker'), name='unique_asset_dividend'),
+        ),
+        migrations.AddIndex(
+            model_name='dividendcalendar',
+            index=models.Index(fields=['payday'], name='strategy_di_payday_a907c5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dividendcalendar',
+            constraint=models.UniqueConstraint(fields=('ticker', 'payday'), name='unique_dividend_calendar'),
+        ),
+    ]
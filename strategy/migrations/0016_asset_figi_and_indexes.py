@@ -0,0 +1,64 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_asset_figi(apps, schema_editor):
+    """Заполнение FIGI из справочника и удаление дублей (тикер, секция торгов)"""
+    AssetData = apps.get_model('strategy', 'AssetData')
+    Instrument = apps.get_model('strategy', 'Instrument')
+
+    figis = {
+        (ticker, class_code): figi
+        for ticker, class_code, figi in Instrument.objects.values_list('ticker', 'class_code', 'figi')
+    }
+    seen = set()
+    duplicates = []
+    assets_to_update = []
+
+    for asset in AssetData.objects.order_by('pk'):
+        key = (asset.ticker, asset.class_code)
+        if key in seen:
+            duplicates.append(asset.pk)
+            continue
+        seen.add(key)
+        if key in figis:
+            asset.figi = figis[key]
+            assets_to_update.append(asset)
+
+    AssetData.objects.filter(pk__in=duplicates).delete()
+    AssetData.objects.bulk_update(assets_to_update, ['figi'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0015_dividend_calendar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetdata',
+            name='figi',
+            field=models.CharField(blank=True, max_length=20, null=True, verbose_name='FIGI'),
+        ),
+        migrations.RunPython(fill_asset_figi, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='assetcandidates',
+            index=models.Index(fields=['owner', 'ticker'], name='strategy_as_owner_i_619d75_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkassets',
+            index=models.Index(fields=['owner', 'ticker'], name='strategy_ch_owner_i_8e72f5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assetdata',
+            constraint=models.UniqueConstraint(fields=('figi',), name='unique_asset_data_figi'),
+        ),
+        migrations.AddConstraint(
+            model_name='assetdata',
+            constraint=models.UniqueConstraint(fields=('ticker', 'class_code'), name='unique_asset_data_ticker'),
+        ),
+    ]
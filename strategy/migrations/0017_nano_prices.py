@@ -0,0 +1,83 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations
+from django.db.models import F
+
+import strategy.fields
+
+NANO = 1_000_000_000
+FLOAT_FIELDS = {
+    'checkassets': ['buy_price', 'current_price', 'excepted_price'],
+    'dividendcalendar': ['dividend'],
+    'assetcandidates': ['price', 'costs', 'dividend'],
+}
+
+
+def to_nano(value):
+    return int((Decimal(str(value)) * NANO).to_integral_value(ROUND_HALF_UP))
+
+
+def convert_prices(apps, schema_editor):
+    """Перевод сумм в рублях с плавающей точкой в целые нано-рубли"""
+    AssetData = apps.get_model('strategy', 'AssetData')
+    AssetData.objects.update(price_nano=F('units') * NANO + F('nano'))
+
+    for model_name, fields in FLOAT_FIELDS.items():
+        model = apps.get_model('strategy', model_name)
+        rows = list(model.objects.only(*fields))
+        for row in rows:
+            for field in fields:
+                setattr(row, f'{field}_nano', to_nano(getattr(row, field)))
+        model.objects.bulk_update(rows, [f'{field}_nano' for field in fields], batch_size=500)
+
+
+def field_operations(model_name, field, verbose_name):
+    return (
+        migrations.RemoveField(model_name=model_name, name=field),
+        migrations.RenameField(model_name=model_name, old_name=f'{field}_nano', new_name=field),
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=strategy.fields.NanoField(verbose_name=verbose_name),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strategy', '0016_asset_figi_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assetdata',
+            name='price_nano',
+            field=strategy.fields.NanoField(default=0),
+        ),
+        *(
+            migrations.AddField(
+                model_name=model_name,
+                name=f'{field}_nano',
+                field=strategy.fields.NanoField(default=0),
+            )
+            for model_name, fields in FLOAT_FIELDS.items()
+            for field in fields
+        ),
+        migrations.RunPython(convert_prices, migrations.RunPython.noop),
+        migrations.RemoveField(model_name='assetdata', name='units'),
+        migrations.RemoveField(model_name='assetdata', name='nano'),
+        migrations.RenameField(model_name='assetdata', old_name='price_nano', new_name='price'),
+        migrations.AlterField(
+            model_name='assetdata',
+            name='price',
+            field=strategy.fields.NanoField(verbose_name='Цена (нано-руб.)'),
+        ),
+        *field_operations('checkassets', 'buy_price', 'Цена покупки'),
+        *field_operations('checkassets', 'current_price', 'Текущая цена'),
+        *field_operations('checkassets', 'excepted_price', 'Ожидаемая цена'),
+        *field_operations('dividendcalendar', 'dividend', 'Дивиденд (нано-руб.)'),
+        *field_operations('assetcandidates', 'price', 'Цена (нано-руб.)'),
+        *field_operations('assetcandidates', 'costs', 'Затраты (нано-руб.)'),
+        *field_operations('assetcandidates', 'dividend', 'Дивиденд (нано-руб.)'),
+    ]
@@ -3,19 +3,26 @@ from django.db import models
 from django.utils import timezone
 from datetime import date
 
+from strategy.fields import NanoField
+from strategy.money import format_nano
+
+
 class CheckAssets(models.Model):
     ticker = models.CharField(max_length=10, verbose_name="Тикер")
-    buy_price = models.FloatField(verbose_name='Цена покупки')
+    buy_price = NanoField(verbose_name='Цена покупки')
     buy_count = models.IntegerField(verbose_name='Количество')
     buy_date = models.DateField(default=timezone.now, verbose_name='Дата покупки')
-    current_price = models.FloatField(verbose_name='Текущая цена')
-    excepted_price = models.FloatField(verbose_name='Ожидаемая цена')
+    current_price = NanoField(verbose_name='Текущая цена')
+    excepted_price = NanoField(verbose_name='Ожидаемая цена')
     is_notified = models.BooleanField(default=False, verbose_name="Проинформирована")
     owner = models.ForeignKey(User, default=1, on_delete=models.CASCADE, verbose_name='Пользователь')
 
     class Meta:
         verbose_name = "Контролируемая акция"
         verbose_name_plural = "Контролируемые акции"
+        indexes = [
+            models.Index(fields=['owner', 'ticker'])
+        ]
         ordering = ['buy_date']
 
     def get_holding_time(self):
@@ -36,19 +43,23 @@ class CheckAssets(models.Model):
 
         return price_diff
 
-    def get_expected_price_by_key_rate(self):
-        expected_price = self.buy_price + (self.buy_price * Settings.objects.get_queryset().first().central_bank_rate / self.get_holding_time())
+    def get_expected_price_by_key_rate(self, central_bank_rate=None):
+        if central_bank_rate is None:
+            from strategy.user_settings import load_settings
+            central_bank_rate = load_settings(self.owner_id).central_bank_rate
+
+        expected_price = self.buy_price + round(self.buy_price * central_bank_rate / self.get_holding_time())
 
         return expected_price
 
-    def get_is_can_sold(self):
-        if self.current_price > self.get_expected_price_by_key_rate() and self.current_price > self.excepted_price:
+    def get_is_can_sold(self, central_bank_rate=None):
+        if self.current_price > self.get_expected_price_by_key_rate(central_bank_rate) and self.current_price > self.excepted_price:
             return True
         else:
             return False
 
-    def get_is_danger(self):
-        if self.get_expected_price_by_key_rate() > self.excepted_price:
+    def get_is_danger(self, central_bank_rate=None):
+        if self.get_expected_price_by_key_rate(central_bank_rate) > self.excepted_price:
             return True
         else:
             return False
@@ -58,18 +69,69 @@ class CheckAssets(models.Model):
         self.save()
 
 class AssetData(models.Model):
+    figi = models.CharField(max_length=20, null=True, blank=True, verbose_name="FIGI")
     ticker = models.CharField(max_length=10, verbose_name="Тикер")
     class_code = models.CharField(max_length=10, verbose_name="Секция торгов")
-    nano = models.IntegerField(verbose_name='Дробная часть цены')
-    units = models.IntegerField(verbose_name='Целая часть цены')
+    price = NanoField(verbose_name="Цена (нано-руб.)")
     logo_url = models.URLField(verbose_name="URL логотипа")
+    lot = models.IntegerField(default=1, verbose_name="Лотность")
+    min_price_increment = models.BigIntegerField(default=0, verbose_name="Шаг цены (нано-руб.)")
 
     class Meta:
         verbose_name = "Акция"
         verbose_name_plural = "Акции"
+        constraints = [
+            models.UniqueConstraint(fields=['figi'], name='unique_asset_data_figi'),
+            models.UniqueConstraint(fields=['ticker', 'class_code'], name='unique_asset_data_ticker')
+        ]
 
     def get_price(self):
-        return self.units + (self.nano / 1_000_000_000)
+        return format_nano(self.price)
+
+class Instrument(models.Model):
+    figi = models.CharField(max_length=20, unique=True, verbose_name="FIGI")
+    ticker = models.CharField(max_length=10, verbose_name="Тикер")
+    class_code = models.CharField(max_length=10, verbose_name="Секция торгов")
+    currency = models.CharField(max_length=10, verbose_name="Валюта")
+    name = models.CharField(max_length=255, verbose_name="Название")
+    logo_url = models.URLField(null=True, blank=True, verbose_name="URL логотипа")
+    lot = models.IntegerField(default=1, verbose_name="Лотность")
+    min_price_increment = models.BigIntegerField(default=0, verbose_name="Шаг цены (нано-руб.)")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Инструмент"
+        verbose_name_plural = "Справочник инструментов"
+
+    def __str__(self):
+        return f'{self.ticker} ({self.class_code})'
+
+class PriceHistory(models.Model):
+    ticker = models.CharField(max_length=10, verbose_name="Тикер")
+    class_code = models.CharField(max_length=10, verbose_name="Секция торгов")
+    timestamp = models.DateTimeField(verbose_name="Время")
+    price = models.BigIntegerField(verbose_name="Цена (нано-руб.)")
+
+    class Meta:
+        verbose_name = "Цена"
+        verbose_name_plural = "История цен"
+        indexes = [models.Index(fields=['ticker', 'timestamp'])]
+
+class PriceDaily(models.Model):
+    ticker = models.CharField(max_length=10, verbose_name="Тикер")
+    class_code = models.CharField(max_length=10, verbose_name="Секция торгов")
+    date = models.DateField(verbose_name="Дата")
+    open = models.BigIntegerField(verbose_name="Открытие (нано-руб.)")
+    high = models.BigIntegerField(verbose_name="Максимум (нано-руб.)")
+    low = models.BigIntegerField(verbose_name="Минимум (нано-руб.)")
+    close = models.BigIntegerField(verbose_name="Закрытие (нано-руб.)")
+
+    class Meta:
+        verbose_name = "Дневная цена"
+        verbose_name_plural = "Дневные цены"
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'class_code', 'date'], name='unique_price_daily')
+        ]
 
 class Settings(models.Model):
     available_capital = models.IntegerField(verbose_name='Доступный капитал (руб.)')
@@ -85,34 +147,55 @@ class Settings(models.Model):
         verbose_name = "Настройка"
         verbose_name_plural = "Настройки"
 
-class AssetDividend(models.Model):
+class DividendCalendar(models.Model):
+    figi = models.CharField(max_length=20, blank=True, verbose_name="FIGI")
     ticker = models.CharField(max_length=10, verbose_name="Тикер")
     company_name = models.CharField(max_length=255, verbose_name="Компания")
     payday = models.DateField(verbose_name="Дата отсечки")
-    dividend = models.FloatField(verbose_name="Дивиденд (руб.)")
-    profitability = models.FloatField(verbose_name="Доходность (%)")
-    price = models.FloatField(verbose_name="Цена (руб.)")
+    dividend = NanoField(verbose_name="Дивиденд (нано-руб.)")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f'{self.ticker} - {self.payday} - {self.dividend}'
+
+    class Meta:
+        verbose_name = "Дивиденд"
+        verbose_name_plural = "Календарь дивидендов"
+        constraints = [
+            models.UniqueConstraint(fields=['ticker', 'payday'], name='unique_dividend_calendar')
+        ]
+        indexes = [
+            models.Index(fields=['payday'])
+        ]
+
+class AssetDividend(models.Model):
+    ticker = models.CharField(max_length=10, verbose_name="Тикер")
     priority = models.IntegerField(null=True, blank=True, verbose_name="Приоритет")
     max_part = models.IntegerField(null=True, blank=True, verbose_name="Максимальная доля (%)")
     owner = models.ForeignKey(User, default=1, on_delete=models.CASCADE, verbose_name="Владелец")
 
     def __str__(self):
-        return f'{self.ticker} - {self.payday} - {self.dividend}'
+        return f'{self.ticker} - {self.owner}'
 
     class Meta:
-        verbose_name = "Дивиденд"
-        verbose_name_plural = "Дивиденды"
-        ordering = ['-profitability']
+        verbose_name = "Дивидендная акция пользователя"
+        verbose_name_plural = "Дивидендные акции пользователей"
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'ticker'], name='unique_asset_dividend')
+        ]
 
 class AssetCandidates(models.Model):
     ticker = models.CharField(max_length=10, verbose_name="Тикер")
-    price = models.FloatField(verbose_name="Цена (руб.)")
+    price = NanoField(verbose_name="Цена (нано-руб.)")
     count = models.IntegerField(verbose_name="Количество")
-    costs = models.FloatField(verbose_name="Затраты (руб.)")
+    costs = NanoField(verbose_name="Затраты (нано-руб.)")
     share = models.FloatField(verbose_name="Доля (%)")
-    dividend = models.FloatField(verbose_name="Дивиденд (руб.)")
+    dividend = NanoField(verbose_name="Дивиденд (нано-руб.)")
     owner = models.ForeignKey(User, default=1, on_delete=models.CASCADE, verbose_name="Владелец")
 
     class Meta:
         verbose_name = "Кандидат"
         verbose_name_plural = "Кандидаты"
+        indexes = [
+            models.Index(fields=['owner', 'ticker'])
+        ]
@@ -0,0 +1,45 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+NANO = 1_000_000_000
+
+
+def quotation_to_nano(quotation):
+    """Цена Quotation/MoneyValue API в целых нано-рублях"""
+    return quotation.units * NANO + quotation.nano
+
+
+def rub_to_nano(value):
+    """Сумма в рублях (строка, Decimal или число) в целых нано-рублях"""
+    return int((Decimal(str(value).replace(',', '.')) * NANO).to_integral_value(ROUND_HALF_UP))
+
+
+def nano_to_rub(value):
+    """Сумма в нано-рублях в виде точного Decimal в рублях"""
+    return (Decimal(int(value)) / NANO).normalize()
+
+
+def round_nano(value, places=2):
+    """Округление суммы или массива сумм в нано-рублях до places знаков (половина от нуля)"""
+    step = 10 ** (9 - places)
+
+    return np.sign(value) * ((np.abs(value) + step // 2) // step * step)
+
+
+def ceil_to_step(value, step):
+    """Округление цены или массива цен в нано-рублях вверх до шага цены; нулевой шаг цену не меняет"""
+    step = np.maximum(step, 1)
+
+    return -(-np.asarray(value) // step) * step
+
+
+def format_nano(value, places=None):
+    """Строка в рублях: точная запись с минимум двумя знаками или округление до places знаков"""
+    value = int(value if places is None else round_nano(int(value), places))
+    sign = '-' if value < 0 else ''
+    units, nano = divmod(abs(value), NANO)
+    digits = f'{nano:09d}'
+    digits = digits.rstrip('0').ljust(2, '0') if places is None else digits[:places]
+
+    return f'{sign}{units}.{digits}' if digits else f'{sign}{units}'
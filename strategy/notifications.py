@@ -0,0 +1,145 @@
+import asyncio
+import logging
+
+import aiohttp
+import numpy as np
+from django.conf import settings
+
+from strategy.models import CheckAssets, Settings
+from strategy.portfolio import Portfolio
+from strategy.rate_limiter import RateLimiter
+
+TELEGRAM_MAX_ATTEMPTS = 5
+TELEGRAM_CONCURRENCY = 10
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MAX_LENGTH = 4096
+
+logger = logging.getLogger(__name__)
+
+# Telegram допускает около 30 сообщений в секунду на бота
+telegram_limiter = RateLimiter('TELEGRAM', capacity=30, period=1)
+
+
+def split_digest(lines, pks):
+    """Разбиение сводки на сообщения не длиннее TELEGRAM_MAX_LENGTH: [(текст, pk позиций), ...]"""
+    messages = []
+    text = ''
+    message_pks = []
+
+    for line, pk in zip(lines, pks):
+        line = line[:TELEGRAM_MAX_LENGTH]
+        if text and len(text) + 1 + len(line) > TELEGRAM_MAX_LENGTH:
+            messages.append((text, message_pks))
+            text = ''
+            message_pks = []
+        text = f'{text}\n{line}' if text else line
+        message_pks.append(pk)
+
+    if text:
+        messages.append((text, message_pks))
+
+    return messages
+
+
+def build_digests(portfolio, indexes):
+    """Группировка сообщений по чатам: [(chat_id, текст, pk позиций), ...]
+
+    Длинная сводка делится на несколько сообщений, позиции отмечаются
+    отправленными вместе с сообщением, в которое они вошли.
+    """
+    owner_ids = set(portfolio.owner_id[indexes].tolist())
+    chat_ids = dict(
+        Settings.objects.filter(owner_id__in=owner_ids).order_by('-pk').values_list('owner_id', 'tg_id')
+    )
+    digests = {}
+
+    for index in indexes:
+        chat_id = chat_ids.get(int(portfolio.owner_id[index]))
+        if not chat_id:
+            continue
+
+        ticker = portfolio.ticker[index]
+        if portfolio.is_can_sold[index]:
+            line = f'Акцию {ticker} можно продать!'
+        else:
+            line = f'Акция {ticker}: цена по ключевой ставке выше ожидаемой'
+
+        lines, pks = digests.setdefault(chat_id, ([], []))
+        lines.append(line)
+        pks.append(int(portfolio.pk[index]))
+
+    return [
+        (chat_id, text, message_pks)
+        for chat_id, (lines, pks) in digests.items()
+        for text, message_pks in split_digest(lines, pks)
+    ]
+
+
+async def send_message(session, semaphore, chat_id, text):
+    """Отправка сообщения с повтором при ограничении частоты и ошибках сервера"""
+    url = f"https://{settings.TELEGRAM_URL}bot{settings.TELEGRAM_TOKEN}/sendMessage"
+    delay = 1
+
+    async with semaphore:
+        for attempt in range(TELEGRAM_MAX_ATTEMPTS):
+            await telegram_limiter.acquire()
+            try:
+                async with session.post(url, json={'chat_id': chat_id, 'text': text}) as response:
+                    if response.status == 200:
+                        return True
+                    if response.status == 429:
+                        data = await response.json(content_type=None)
+                        delay = data.get('parameters', {}).get('retry_after', delay)
+                    elif response.status < 500:
+                        logger.warning("Telegram отклонил сообщение для %s: %s", chat_id, response.status)
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                # ValueError — некорректный JSON в ответе 429
+                logger.warning("Ошибка отправки сообщения для %s: %r", chat_id, e)
+
+            await asyncio.sleep(delay)
+            delay *= 2
+
+    return False
+
+
+async def send_digests(digests):
+    """Параллельная отправка сводок через общий пул соединений; возвращает отправленные сводки
+
+    Ошибка отправки одного сообщения не прерывает отправку остальных.
+    """
+    semaphore = asyncio.Semaphore(TELEGRAM_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=TELEGRAM_CONCURRENCY)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+        results = await asyncio.gather(
+            *(send_message(session, semaphore, chat_id, text) for chat_id, text, _ in digests),
+            return_exceptions=True
+        )
+
+    sent = []
+    for digest, result in zip(digests, results):
+        if isinstance(result, Exception):
+            logger.error("Ошибка отправки сообщения для %s: %r", digest[0], result)
+        elif result:
+            sent.append(digest)
+
+    return sent
+
+
+def notify():
+    """Оповещение пользователей только о позициях, сменивших состояние"""
+    portfolio = Portfolio.load()
+    is_signal = portfolio.is_can_sold | portfolio.is_danger
+    to_notify = np.flatnonzero(is_signal & ~portfolio.is_notified)
+    to_reset = portfolio.pk[~is_signal & portfolio.is_notified].tolist()
+
+    digests = build_digests(portfolio, to_notify)
+    sent_digests = asyncio.run(send_digests(digests)) if digests else []
+    sent_chat_ids = {chat_id for chat_id, _, _ in sent_digests}
+    notified = [pk for _, _, pks in sent_digests for pk in pks]
+
+    CheckAssets.objects.filter(pk__in=notified).update(is_notified=True)
+    CheckAssets.objects.filter(pk__in=to_reset).update(is_notified=False)
+
+    return len(sent_chat_ids), len(notified), len(to_reset)
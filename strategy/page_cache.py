@@ -0,0 +1,63 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from strategy.price_snapshot import version_key
+
+# Устаревшие фрагменты недоступны по ключу после смены версий, срок жизни лишь ограничивает память
+PAGE_CACHE_TIMEOUT = 24 * 3600
+
+
+def user_data_key(owner_id):
+    return cache.make_key(f'user_data_version:{owner_id}')
+
+
+def bump_user_data(owner_ids):
+    """Сброс кеша страниц пользователей после изменения их позиций, настроек или кандидатов"""
+    try:
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        for owner_id in owner_ids:
+            pipeline.incr(user_data_key(owner_id))
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def get_page_vary(owner_id):
+    """Ключ фрагментов пользователя: версия снимка цен, версия данных пользователя и текущая дата
+
+    Дата входит в ключ, потому что время владения на дашборде зависит от нее.
+    Возвращает None, если Redis недоступен.
+    """
+    try:
+        prices_version, data_version = get_redis_connection('default').mget([version_key(), user_data_key(owner_id)])
+    except RedisError:
+        return None
+
+    return f'{owner_id}:{int(prices_version or 0)}:{int(data_version or 0)}:{date.today().isoformat()}'
+
+
+async def aget_cached_page(fragment_name, owner_id):
+    """Контекст фрагмента страницы: версии для тега {% cache %} и сам фрагмент, если он уже в кеше
+
+    Фрагмент читается здесь, а не только тегом в шаблоне: если бы он истек между
+    проверкой и рендерингом, тег закешировал бы страницу с пустым контекстом.
+    При попадании представлению не нужно строить остальной контекст.
+    """
+    vary = await sync_to_async(get_page_vary)(owner_id)
+    if vary is None:
+        # Без версий фрагмент нельзя безопасно закешировать
+        return {'page_vary': '', 'page_cache_timeout': 0, 'page_fragment': None}
+
+    fragment = await caches['pages'].aget(make_template_fragment_key(fragment_name, [vary]))
+
+    return {
+        'page_vary': vary,
+        'page_cache_timeout': PAGE_CACHE_TIMEOUT,
+        'page_fragment': None if fragment is None else mark_safe(fragment)
+    }
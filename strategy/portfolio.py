@@ -0,0 +1,127 @@
+from datetime import date
+
+import numpy as np
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from strategy.models import AssetData, CheckAssets, Settings
+from strategy.price_snapshot import aget_market_data, get_market_data
+
+
+def with_owner_rate(queryset):
+    """Добавление к позициям ключевой ставки владельца"""
+    owner_settings = Settings.objects.filter(owner=OuterRef('owner')).order_by('pk')
+
+    return queryset.annotate(
+        central_bank_rate=Subquery(owner_settings.values('central_bank_rate')[:1])
+    )
+
+
+def with_market_fields(rows, market):
+    """Добавление к строкам позиций последней цены и логотипа из данных рынка"""
+    result = []
+    for row in rows:
+        price, _, logo_url = market.get(row[1], (None, None, None))
+        result.append(row + (price, logo_url))
+
+    return result
+
+
+def update_current_prices():
+    """Перенос актуальных цен в контролируемые акции одним UPDATE"""
+    prices = AssetData.objects.filter(ticker=OuterRef('ticker')).order_by('pk')
+
+    return CheckAssets.objects.update(
+        current_price=Coalesce(Subquery(prices.values('price')[:1]), F('current_price'))
+    )
+
+
+def holding_months(buy_dates, today=None):
+    """Время владения в месяцах, как в CheckAssets.get_holding_time"""
+    today = today or date.today()
+    months = np.datetime64(today, 'M').astype(np.int64) - buy_dates.astype('datetime64[M]').astype(np.int64)
+
+    return np.where(months == 0, 1, months)
+
+
+class Portfolio:
+    """Показатели набора позиций CheckAssets, рассчитанные за один векторный проход
+
+    Цены и суммы хранятся в массивах int64 в нано-рублях, поэтому итоги
+    считаются точно; дробной остается только цена по ключевой ставке,
+    которая округляется до нано-рубля. Последние цены и логотипы читаются
+    из снимка цен в Redis.
+    """
+
+    FIELDS = (
+        'pk', 'ticker', 'buy_price', 'buy_count', 'buy_date', 'current_price', 'excepted_price',
+        'is_notified', 'owner_id', 'central_bank_rate', 'last_price', 'logo_url'
+    )
+    POSITION_FIELDS = FIELDS[:-2]
+
+    def __init__(self, rows, today=None):
+        columns = list(zip(*rows)) or [()] * len(self.FIELDS)
+        values = dict(zip(self.FIELDS, columns))
+
+        self.pk = np.array(values['pk'], dtype=np.int64)
+        self.ticker = list(values['ticker'])
+        self.logo_url = list(values['logo_url'])
+        self.owner_id = np.array(values['owner_id'], dtype=np.int64)
+        self.buy_price = np.array(values['buy_price'], dtype=np.int64)
+        self.buy_count = np.array(values['buy_count'], dtype=np.int64)
+        self.buy_date = np.array(values['buy_date'], dtype='datetime64[D]')
+        self.excepted_price = np.array(values['excepted_price'], dtype=np.int64)
+        self.is_notified = np.array(values['is_notified'], dtype=bool)
+        # Акции без цены в AssetData сохраняют последнюю записанную цену
+        self.current_price = np.array(
+            [stored if last is None else last for last, stored in zip(values['last_price'], values['current_price'])],
+            dtype=np.int64
+        )
+        # Отсутствующая ставка превращается в nan, сигналы по таким позициям не формируются
+        self.central_bank_rate = np.array(values['central_bank_rate'], dtype=np.float64)
+        has_rate = ~np.isnan(self.central_bank_rate)
+
+        self.holding_time = holding_months(self.buy_date, today)
+        self.price_diff = (self.current_price - self.buy_price) * self.buy_count
+        self.expected_price_by_key_rate = self.buy_price + np.rint(
+            self.buy_price * np.nan_to_num(self.central_bank_rate) / self.holding_time
+        ).astype(np.int64)
+        self.is_can_sold = (
+            has_rate & (self.current_price > self.expected_price_by_key_rate) & (self.current_price > self.excepted_price)
+        )
+        self.is_danger = has_rate & (self.expected_price_by_key_rate > self.excepted_price)
+
+    @classmethod
+    def load(cls, queryset=None, today=None):
+        if queryset is None:
+            queryset = CheckAssets.objects.all()
+
+        rows = list(with_owner_rate(queryset).values_list(*cls.POSITION_FIELDS))
+        market = get_market_data({row[1] for row in rows})
+
+        return cls(with_market_fields(rows, market), today)
+
+    @classmethod
+    async def aload(cls, queryset=None, today=None):
+        if queryset is None:
+            queryset = CheckAssets.objects.all()
+
+        rows = [row async for row in with_owner_rate(queryset).values_list(*cls.POSITION_FIELDS)]
+        market = await aget_market_data({row[1] for row in rows})
+
+        return cls(with_market_fields(rows, market), today)
+
+    def __len__(self):
+        return len(self.pk)
+
+    @property
+    def total_price(self):
+        return int(np.sum(self.current_price * self.buy_count))
+
+    @property
+    def total_p_f(self):
+        return int(np.sum(self.price_diff))
+
+    @property
+    def total_owner_period(self):
+        return int(self.holding_time.max(initial=0))
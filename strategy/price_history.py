@@ -0,0 +1,154 @@
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+import numpy as np
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from strategy.models import AssetData, PriceHistory, PriceDaily
+
+RAW_RETENTION_DAYS = 7
+DAILY_RETENTION_DAYS = 5 * 365
+
+
+def record_prices(assets, timestamp=None):
+    """Добавление цен AssetData в историю одним пакетом"""
+    timestamp = timestamp or timezone.now()
+
+    return len(PriceHistory.objects.bulk_create(
+        PriceHistory(
+            ticker=asset.ticker,
+            class_code=asset.class_code,
+            timestamp=timestamp,
+            price=asset.price
+        )
+        for asset in assets
+    ))
+
+
+def aggregate_daily(rows):
+    """Свертка упорядоченных по времени цен (тикер, секция, дата, цена) в дневные OHLC"""
+    for (ticker, class_code, day), group in groupby(rows, key=lambda row: row[:3]):
+        prices = np.fromiter((row[3] for row in group), dtype=np.int64)
+        yield PriceDaily(
+            ticker=ticker,
+            class_code=class_code,
+            date=day,
+            open=int(prices[0]),
+            high=int(prices.max()),
+            low=int(prices.min()),
+            close=int(prices[-1])
+        )
+
+
+def fill_daily(rows, last_closes, tracked, last_day):
+    """Дневные OHLC с переносом цены закрытия на дни без изменений цены
+
+    История хранит только изменения цен, поэтому цена на начало дня — это
+    закрытие предыдущего дня: оно становится ценой открытия и учитывается
+    в максимуме и минимуме. Дни без изменений до last_day включительно
+    заполняются предыдущим закрытием для отслеживаемых серий (tracked) и
+    серий с новыми ценами. last_closes — {(тикер, секция): (дата, закрытие)}
+    из уже свернутых дней.
+    """
+    raw = {}
+    for (ticker, class_code, day), group in groupby(rows, key=lambda row: row[:3]):
+        raw.setdefault((ticker, class_code), {})[day] = [row[3] for row in group]
+
+    for key in sorted(set(raw) | (set(last_closes) & tracked)):
+        days = raw.get(key, {})
+        known_date, close = last_closes.get(key, (None, None))
+        start = known_date + timedelta(days=1) if known_date else min(days)
+        fill_days = {start + timedelta(days=i) for i in range((last_day - start).days + 1)}
+
+        for day in sorted(set(days) | fill_days):
+            prices = ([close] if close is not None else []) + days.get(day, [])
+            if not prices:
+                continue
+            close = prices[-1]
+            yield PriceDaily(
+                ticker=key[0],
+                class_code=key[1],
+                date=day,
+                open=prices[0],
+                high=max(prices),
+                low=min(prices),
+                close=close
+            )
+
+
+def get_last_closes(before):
+    """Последнее свернутое закрытие каждой серии до даты before: {(тикер, секция): (дата, закрытие)}"""
+    latest = PriceDaily.objects.filter(
+        ticker=OuterRef('ticker'), class_code=OuterRef('class_code'), date__lt=before
+    ).order_by('-date')
+    rows = PriceDaily.objects.filter(pk=Subquery(latest.values('pk')[:1]))
+
+    return {
+        (ticker, class_code): (day, close)
+        for ticker, class_code, day, close in rows.values_list('ticker', 'class_code', 'date', 'close')
+    }
+
+
+def raw_rows(queryset):
+    return queryset.annotate(day=TruncDate('timestamp')).order_by(
+        'ticker', 'class_code', 'timestamp'
+    ).values_list('ticker', 'class_code', 'day', 'price')
+
+
+def compact_history(raw_days=RAW_RETENTION_DAYS, retention_days=DAILY_RETENTION_DAYS):
+    """Свертка старых цен в дневные OHLC и удаление данных старше срока хранения
+
+    Сворачиваются только полностью прошедшие дни старше raw_days, поэтому
+    каждый день попадает в PriceDaily один раз. Дни без изменений цены
+    заполняются предыдущим закрытием, так что дневной ряд не имеет пропусков.
+    """
+    today = timezone.localdate()
+    cutoff_day = today - timedelta(days=raw_days)
+    raw_cutoff = timezone.make_aware(datetime.combine(cutoff_day, time.min))
+    old_rows = PriceHistory.objects.filter(timestamp__lt=raw_cutoff)
+    tracked = set(AssetData.objects.values_list('ticker', 'class_code'))
+
+    with transaction.atomic():
+        daily = list(fill_daily(
+            raw_rows(old_rows).iterator(), get_last_closes(cutoff_day), tracked, cutoff_day - timedelta(days=1)
+        ))
+        PriceDaily.objects.bulk_create(
+            daily,
+            update_conflicts=True,
+            unique_fields=['ticker', 'class_code', 'date'],
+            update_fields=['open', 'high', 'low', 'close'],
+            batch_size=500
+        )
+        raw_deleted, _ = old_rows.delete()
+        daily_deleted, _ = PriceDaily.objects.filter(date__lt=today - timedelta(days=retention_days)).delete()
+
+    return len(daily), raw_deleted, daily_deleted
+
+
+def get_daily_closes(ticker, class_code=None):
+    """Дневные цены закрытия тикера: даты (datetime64[D]) и цены (int64, нано-руб.)
+
+    Дни из PriceDaily дополняются еще не свернутыми ценами из PriceHistory,
+    дни без изменений цены заполняются предыдущим закрытием.
+    """
+    daily = PriceDaily.objects.filter(ticker=ticker)
+    raw = PriceHistory.objects.filter(ticker=ticker)
+    if class_code:
+        daily = daily.filter(class_code=class_code)
+        raw = raw.filter(class_code=class_code)
+
+    closes = dict(daily.order_by('date').values_list('date', 'close'))
+    for row in aggregate_daily(raw_rows(raw)):
+        closes.setdefault(row.date, row.close)
+
+    dates = np.array(sorted(closes), dtype='datetime64[D]')
+    prices = np.array([closes[day] for day in sorted(closes)], dtype=np.int64)
+    if not len(dates):
+        return dates, prices
+
+    all_dates = np.arange(dates[0], dates[-1] + 1)
+
+    return all_dates, prices[np.searchsorted(dates, all_dates, side='right') - 1]
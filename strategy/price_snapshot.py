@@ -0,0 +1,146 @@
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from strategy.models import AssetData
+
+# Снимок переживает несколько пропущенных запусков updates_assets, затем чтение переходит на базу
+SNAPSHOT_TIMEOUT = 3600
+
+# Частичное обновление применяется только к существующему снимку, иначе
+# в Redis появился бы неполный снимок, который читатели приняли бы за полный
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('HSET', KEYS[1], unpack(ARGV))
+return redis.call('INCR', KEYS[2])
+"""
+
+_update_script = None
+
+
+def snapshot_key():
+    return cache.make_key('prices:snapshot')
+
+
+def version_key():
+    return cache.make_key('prices:version')
+
+
+def market_rows(queryset):
+    """Цена, лот и логотип по тикеру: первая запись AssetData, как в запросах представлений"""
+    rows = {}
+    for ticker, price, lot, logo_url in queryset.order_by('pk').values_list('ticker', 'price', 'lot', 'logo_url'):
+        rows.setdefault(ticker, (price, lot, logo_url))
+
+    return rows
+
+
+def encode(rows):
+    return {ticker: json.dumps(row) for ticker, row in rows.items()}
+
+
+def publish_snapshot():
+    """Публикация снимка цен всех акций и увеличение версии
+
+    Снимок записывается во временный ключ и подменяется через RENAME в одной
+    транзакции с INCR версии, поэтому читатели видят либо старый, либо новый
+    снимок целиком. Возвращает новую версию или None, если Redis недоступен.
+    """
+    rows = market_rows(AssetData.objects.all())
+    key = snapshot_key()
+    tmp_key = f'{key}:{uuid.uuid4().hex}'
+
+    try:
+        redis = get_redis_connection('default')
+        if rows:
+            # Срок жизни временного ключа на случай сбоя до RENAME
+            redis.pipeline(transaction=False).hset(tmp_key, mapping=encode(rows)).expire(
+                tmp_key, SNAPSHOT_TIMEOUT
+            ).execute()
+
+        pipeline = redis.pipeline(transaction=True)
+        if rows:
+            pipeline.rename(tmp_key, key)
+            pipeline.expire(key, SNAPSHOT_TIMEOUT)
+        else:
+            pipeline.delete(key)
+        pipeline.incr(version_key())
+        return pipeline.execute()[-1]
+    except RedisError:
+        return None
+
+
+def bump_version():
+    """Увеличение версии без изменения снимка, например после обновления календаря дивидендов"""
+    try:
+        return get_redis_connection('default').incr(version_key())
+    except RedisError:
+        return None
+
+
+def update_snapshot(tickers):
+    """Обновление цен отдельных акций в опубликованном снимке
+
+    Возвращает новую версию или None, если снимка нет или Redis недоступен.
+    """
+    global _update_script
+
+    rows = market_rows(AssetData.objects.filter(ticker__in=tickers))
+    if not rows:
+        return None
+
+    try:
+        if _update_script is None:
+            _update_script = get_redis_connection('default').register_script(UPDATE_SCRIPT)
+        args = [value for item in encode(rows).items() for value in item]
+        return _update_script(keys=[snapshot_key(), version_key()], args=args)
+    except RedisError:
+        return None
+
+
+def read_snapshot(tickers):
+    """Данные акций из снимка одним HMGET; None, если снимка нет или Redis недоступен"""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+
+    try:
+        pipeline = get_redis_connection('default').pipeline(transaction=False)
+        pipeline.exists(snapshot_key())
+        pipeline.hmget(snapshot_key(), tickers)
+        exists, values = pipeline.execute()
+    except RedisError:
+        return None
+
+    if not exists:
+        return None
+
+    # Акции, отсутствующие в полном снимке, отсутствуют и в базе
+    return {ticker: tuple(json.loads(value)) for ticker, value in zip(tickers, values) if value is not None}
+
+
+def get_market_data(tickers):
+    """Цена, лот и логотип акций из снимка в Redis с чтением из базы при промахе"""
+    rows = read_snapshot(tickers)
+    if rows is None:
+        rows = market_rows(AssetData.objects.filter(ticker__in=tickers))
+
+    return rows
+
+
+async def aget_market_data(tickers):
+    """Асинхронный вариант get_market_data"""
+    rows = await sync_to_async(read_snapshot)(tickers)
+    if rows is None:
+        rows = {}
+        queryset = AssetData.objects.filter(ticker__in=tickers).order_by('pk')
+        async for ticker, price, lot, logo_url in queryset.values_list('ticker', 'price', 'lot', 'logo_url'):
+            rows.setdefault(ticker, (price, lot, logo_url))
+
+    return rows
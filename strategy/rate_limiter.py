@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+# Пополнение и списание токенов выполняется одним атомарным скриптом,
+# время берется из Redis, чтобы все воркеры использовали одни часы
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if requested > 0 then
+    if tokens >= requested then
+        tokens = tokens - requested
+    else
+        wait = (requested - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+end
+return {tostring(wait), tostring(tokens)}
+"""
+
+
+class LocalTokenBucket:
+    """Token bucket в памяти процесса, используется при недоступности Redis"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, requested):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            wait = 0
+
+            if requested > 0:
+                if self.tokens >= requested:
+                    self.tokens -= requested
+                else:
+                    wait = (requested - self.tokens) / self.rate
+
+            return wait, self.tokens
+
+
+class RateLimiter:
+    """Распределенный token bucket: capacity запросов за period секунд
+
+    Состояние хранится в Redis и разделяется всеми процессами; если Redis
+    недоступен, лимит соблюдается в пределах текущего процесса.
+    """
+
+    def __init__(self, name, capacity, period):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.local = LocalTokenBucket(capacity, self.rate)
+        self.script = None
+
+    @property
+    def key(self):
+        # Ключ вычисляется при обращении, а не при импорте, чтобы учитывать текущие настройки кеша
+        return cache.make_key(f'RATE_LIMIT:{self.name}')
+
+    def take(self, requested=1):
+        """Списание токенов; возвращает время ожидания и остаток токенов"""
+        try:
+            if self.script is None:
+                self.script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+            wait, tokens = self.script(keys=[self.key], args=[self.capacity, self.rate, requested])
+            return float(wait), float(tokens)
+        except RedisError:
+            return self.local.take(requested)
+
+    async def acquire(self, log=None):
+        """Ожидание токена ровно столько, сколько нужно для его появления"""
+        while True:
+            wait, tokens = self.take()
+            if not wait:
+                return
+
+            if log and wait >= 1:
+                log(f"Исчерпан лимит запросов к API. Повторный запрос через {wait:.1f} секунд")
+            await asyncio.sleep(wait)
+
+    def usage(self):
+        """Текущее использование лимита без списания токенов"""
+        _, tokens = self.take(0)
+
+        return {
+            'capacity': self.capacity,
+            'available': int(tokens),
+            'used': self.capacity - int(tokens)
+        }
@@ -1,10 +1,12 @@
 from datetime import date
 
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from strategy.models import Settings
+from strategy.models import AssetDividend, CheckAssets, Settings
+from strategy.page_cache import bump_user_data
+from strategy.user_settings import invalidate_settings
 
 
 @receiver(post_save, sender=User)
@@ -20,3 +22,19 @@ def send_welcome_email(sender, instance, created, **kwargs):
             tg_id=0,
             owner=instance
         )
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def reset_settings_cache(sender, instance, **kwargs):
+    invalidate_settings(instance.owner_id)
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+@receiver(post_save, sender=CheckAssets)
+@receiver(post_delete, sender=CheckAssets)
+@receiver(post_save, sender=AssetDividend)
+@receiver(post_delete, sender=AssetDividend)
+def reset_page_cache(sender, instance, **kwargs):
+    bump_user_data([instance.owner_id])
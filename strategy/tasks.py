@@ -1,7 +1,13 @@
-from celery import shared_task
+from celery import shared_task, current_task
 from django.core.management import call_command
 
 
+def report_progress(current, total):
+    """Публикация прогресса, если команда выполняется внутри задачи Celery"""
+    if current_task and current_task.request.id and not current_task.request.called_directly:
+        current_task.update_state(state='PROGRESS', meta={'current': current, 'total': total})
+
+
 @shared_task
 def updates_assets():
     try:
@@ -12,9 +18,38 @@ def updates_assets():
         raise
 
 @shared_task
-def reset_counter():
+def compact_price_history():
+    try:
+        call_command('compact_price_history')
+        return "Command executed successfully"
+    except Exception as e:
+        print(f"Error executing command: {e}")
+        raise
+
+@shared_task
+def updates_dividends(user_id):
+    try:
+        # Запуск по кнопке пользователя всегда обновляет календарь, пропуск свежего периода — только для расписания
+        call_command('updates_dividends', user_id=user_id, force=True)
+        return "Command executed successfully"
+    except Exception as e:
+        print(f"Error executing command: {e}")
+        raise
+
+@shared_task
+def get_candidates(user_id):
+    try:
+        call_command('get_candidates', user_id=user_id)
+        return "Command executed successfully"
+    except Exception as e:
+        print(f"Error executing command: {e}")
+        raise
+
+@shared_task
+def updates_dividends_all_users():
     try:
-        call_command('reset_counter')
+        call_command('updates_dividends', all_users=True)
+        call_command('get_candidates', all_users=True)
         return "Command executed successfully"
     except Exception as e:
         print(f"Error executing command: {e}")
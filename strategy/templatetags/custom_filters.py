@@ -1,5 +1,7 @@
 from django import template
 
+from strategy.money import format_nano
+
 register = template.Library()
 
 @register.filter
@@ -8,4 +10,12 @@ def remove_after_last_underscore(value):
 
     if '_' in value:
         return value.rsplit('_', 1)[0]
-    return value
\ No newline at end of file
+    return value
+
+@register.filter
+def rub(value, places=None):
+    """Сумма в нано-рублях в рублях: {{ price|rub }} или с округлением {{ total|rub:2 }}"""
+    if value is None or value == '':
+        return ''
+
+    return format_nano(value, None if places is None else int(places))
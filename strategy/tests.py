@@ -1,3 +1,737 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import random
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+from datetime import date, datetime, time as day_time, timedelta
+from importlib.util import find_spec
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from strategy import backtest
+from strategy.allocation import MONTHLY_DIVIDEND_LIMIT, allocate
+from strategy.candidates import refresh_candidates
+from strategy.models import (
+    AssetCandidates, AssetData, AssetDividend, CheckAssets, DividendCalendar, PriceDaily, PriceHistory, Settings
+)
+from strategy.money import NANO, ceil_to_step, format_nano, rub_to_nano
+from strategy.notifications import TELEGRAM_MAX_LENGTH, send_digests, split_digest
+from strategy.price_history import compact_history, get_daily_closes
+from strategy.price_snapshot import publish_snapshot, snapshot_key
+from strategy.rate_limiter import LocalTokenBucket, RateLimiter
+from strategy.user_settings import aload_settings, get_all_user_settings, load_settings, settings_cache_key
+
+Quotation = namedtuple('Quotation', ['units', 'nano'])
+
+# Отдельный префикс, чтобы тесты не затирали снимок цен и кеш страниц работающего приложения
+TEST_CACHES = {alias: {**config, 'KEY_PREFIX': 'test'} for alias, config in settings.CACHES.items()}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='investor', password='password')
+        AssetData.objects.bulk_create(
+            AssetData(ticker=f'T{i}', class_code='TQBR', price=(100 + i) * NANO + 500_000_000, logo_url='')
+            for i in range(50)
+        )
+        CheckAssets.objects.bulk_create(
+            CheckAssets(
+                ticker=f'T{i}',
+                buy_price=100 * NANO,
+                buy_count=10,
+                buy_date=date(2025, 1, 1),
+                current_price=0,
+                excepted_price=110 * NANO,
+                owner=cls.user
+            )
+            for i in range(50)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        publish_snapshot()
+
+    def tearDown(self):
+        cache.delete_pattern('*')
+
+    def assert_dashboard(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_assets'], 50)
+        asset = CheckAssets.objects.get(ticker='T0')
+        self.assertEqual(response.context['assets'][f'T0_{asset.pk}'][5], 100_500_000_000)
+        # Итог считается в целых нано-рублях без накопления ошибки округления
+        self.assertEqual(response.context['total_price'], sum((100 + i) * NANO + 500_000_000 for i in range(50)) * 10)
+
+    def test_query_budget(self):
+        # Сессия, пользователь и позиции вместе с настройками; цены читаются из снимка в Redis
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+
+        self.assert_dashboard(response)
+
+    def test_snapshot_miss(self):
+        get_redis_connection('default').delete(snapshot_key())
+
+        # При отсутствии снимка цены читаются из базы одним запросом
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard'))
+
+        self.assert_dashboard(response)
+
+    def test_no_writes_on_get(self):
+        self.client.get(reverse('dashboard'))
+
+        self.assertFalse(CheckAssets.objects.exclude(current_price=0).exists())
+
+    def test_page_cache(self):
+        self.client.get(reverse('dashboard'))
+
+        # Повторная загрузка берет фрагмент из кеша: только сессия и пользователь
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'ИТОГО: 50 активов')
+
+        CheckAssets.objects.get(ticker='T0').delete()
+
+        # Удаление позиции меняет версию данных пользователя
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'ИТОГО: 49 активов')
+
+    @skipUnless(find_spec('t_tech'), 't-tech-investments не установлен')
+    def test_stream_prices_without_snapshot(self):
+        from strategy.management.commands.stream_prices import Command as StreamPricesCommand
+
+        AssetData.objects.filter(ticker='T0').update(figi='FIGI0')
+        self.client.get(reverse('dashboard'))
+        get_redis_connection('default').delete(snapshot_key())
+
+        StreamPricesCommand.save_prices({'FIGI0': None}, {'FIGI0': Quotation(units=200, nano=0)})
+
+        # Цена из потока меняет итог, хотя снимка для частичного обновления нет
+        response = self.client.get(reverse('dashboard'))
+        total = sum((100 + i) * NANO + 500_000_000 for i in range(1, 50)) * 10 + 200 * NANO * 10
+        self.assertContains(response, f'на сумму {format_nano(total, 2)}')
+
+
+class MoneyTests(TestCase):
+    def test_round_trip(self):
+        self.assertEqual(rub_to_nano('0,1'), 100_000_000)
+        self.assertEqual(rub_to_nano(0.1) * 3, rub_to_nano('0.3'))
+        self.assertEqual(format_nano(rub_to_nano('1234.5')), '1234.50')
+        self.assertEqual(format_nano(rub_to_nano('0.0123')), '0.0123')
+        self.assertEqual(format_nano(rub_to_nano('-2.005'), 2), '-2.01')
+
+    def test_ceil_to_step(self):
+        step = rub_to_nano('0.5')
+        self.assertEqual(ceil_to_step([rub_to_nano('10.2'), rub_to_nano('10.5')], step).tolist(), [10_500_000_000] * 2)
+        # Шаг цены неизвестен
+        self.assertEqual(ceil_to_step(rub_to_nano('10.2'), 0), rub_to_nano('10.2'))
+
+
+class NotificationTests(TestCase):
+    def test_split_digest(self):
+        lines = [f'Акцию T{i:04d} можно продать!' + ' ' * 100 for i in range(200)]
+        messages = split_digest(lines, list(range(200)))
+
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(text) <= TELEGRAM_MAX_LENGTH for text, _ in messages))
+        # Каждая позиция попадает ровно в одно сообщение вместе со своей строкой
+        self.assertEqual([pk for _, pks in messages for pk in pks], list(range(200)))
+        self.assertEqual('\n'.join(text for text, _ in messages), '\n'.join(lines))
+
+    def test_failed_chat_does_not_abort_others(self):
+        async def send_message(session, semaphore, chat_id, text):
+            if chat_id == 1:
+                raise RuntimeError('unexpected')
+            return chat_id != 3
+
+        digests = [(1, 'a', [10]), (2, 'b', [20]), (3, 'c', [30])]
+        with mock.patch('strategy.notifications.send_message', send_message), \
+                self.assertLogs('strategy.notifications', 'ERROR'):
+            sent = asyncio.run(send_digests(digests))
+
+        self.assertEqual(sent, [(2, 'b', [20])])
+
+
+class DividendCalendarMigrationTests(TransactionTestCase):
+    migrate_from = [('strategy', '0014_lot_and_price_increment')]
+    migrate_to = [('strategy', '0015_dividend_calendar')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.old_apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+
+        return executor.loader.project_state(self.migrate_to).apps
+
+    def test_calendar_copy_and_duplicates(self):
+        user = self.old_apps.get_model('auth', 'User').objects.create(username='investor')
+        AssetDividend = self.old_apps.get_model('strategy', 'AssetDividend')
+        self.old_apps.get_model('strategy', 'Instrument').objects.create(
+            figi='BBG004730N88', ticker='SBER', class_code='TQBR', name='Сбербанк', currency='rub', logo_url='',
+            updated_at=timezone.now()
+        )
+        fields = {'company_name': 'Сбербанк', 'dividend': 33.3, 'price': 300, 'profitability': 11.1, 'owner': user}
+        AssetDividend.objects.create(ticker='SBER', payday=date(2026, 7, 1), priority=None, max_part=None, **fields)
+        AssetDividend.objects.create(ticker='SBER', payday=date(2026, 7, 1), priority=5, max_part=20, **fields)
+        AssetDividend.objects.create(ticker='SBER', payday=date(2026, 12, 1), priority=None, max_part=None, **fields)
+        AssetDividend.objects.create(ticker='GAZP', payday=date(2026, 7, 1), priority=None, max_part=None, **fields)
+        newest = AssetDividend.objects.create(
+            ticker='GAZP', payday=date(2026, 7, 1), priority=None, max_part=None, **fields
+        )
+
+        new_apps = self.migrate()
+
+        calendar = new_apps.get_model('strategy', 'DividendCalendar').objects
+        self.assertEqual(
+            sorted(calendar.values_list('ticker', 'payday', 'figi')),
+            [('GAZP', date(2026, 7, 1), ''), ('SBER', date(2026, 7, 1), 'BBG004730N88'),
+             ('SBER', date(2026, 12, 1), 'BBG004730N88')]
+        )
+        # Из дублей остается запись с заполненным приоритетом, а без него — самая новая
+        preferences = new_apps.get_model('strategy', 'AssetDividend').objects.order_by('ticker')
+        self.assertEqual(list(preferences.values_list('ticker', 'priority', 'max_part')), [
+            ('GAZP', None, None), ('SBER', 5, 20)
+        ])
+        self.assertEqual(preferences.get(ticker='GAZP').pk, newest.pk)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RateLimiterTests(TestCase):
+    def tearDown(self):
+        cache.delete_pattern('*')
+
+    def test_take_under_limit_and_wait(self):
+        limiter = RateLimiter('TEST', capacity=3, period=3)
+
+        self.assertEqual([limiter.take()[0] for _ in range(3)], [0, 0, 0])
+        # Токены закончились: следующий появится через 1 / rate = 1 секунду
+        wait, tokens = limiter.take()
+        self.assertAlmostEqual(wait, 1, delta=0.05)
+        self.assertLess(tokens, 1)
+        self.assertTrue(limiter.key.startswith('test:'))
+
+    def test_refill(self):
+        limiter = RateLimiter('TEST', capacity=5, period=0.1)
+        for _ in range(5):
+            limiter.take()
+        self.assertGreater(limiter.take()[0], 0)
+
+        time.sleep(0.1)
+
+        # За период токены восполняются до емкости, но не больше
+        self.assertEqual(limiter.take()[0], 0)
+        self.assertLessEqual(limiter.usage()['available'], 5)
+
+    def test_local_fallback_on_redis_error(self):
+        limiter = RateLimiter('TEST', capacity=2, period=2)
+
+        with mock.patch('strategy.rate_limiter.get_redis_connection', side_effect=RedisError):
+            self.assertEqual(limiter.take()[0], 0)
+            self.assertEqual(limiter.take()[0], 0)
+            self.assertAlmostEqual(limiter.take()[0], 1, delta=0.05)
+
+        self.assertLess(limiter.local.tokens, 1)
+
+    def test_local_bucket_refill(self):
+        with mock.patch('strategy.rate_limiter.time.monotonic', return_value=100.0):
+            bucket = LocalTokenBucket(capacity=2, rate=1)
+            bucket.take(2)
+            self.assertEqual(bucket.take(1), (1.0, 0.0))
+
+        with mock.patch('strategy.rate_limiter.time.monotonic', return_value=101.5):
+            self.assertEqual(bucket.take(1), (0, 0.5))
+
+        with mock.patch('strategy.rate_limiter.time.monotonic', return_value=200.0):
+            # Простой не накапливает токенов сверх емкости
+            self.assertEqual(bucket.take(0), (0, 2))
+
+
+class AllocationTests(TestCase):
+    @staticmethod
+    def brute_force(prices, dividends, max_parts, capital, commission, tax, lots):
+        """Лучший дивиденд после налога полным перебором количества лотов"""
+        ranges = []
+        for price, dividend, max_part, lot in zip(prices, dividends, max_parts, lots):
+            bound = min(capital * max_part / 100 // (price * lot), capital * MONTHLY_DIVIDEND_LIMIT // (dividend * lot))
+            ranges.append(range(int(bound) + 1))
+
+        best = 0
+        for lot_counts in itertools.product(*ranges):
+            costs = sum(k * lot * price * (1 + commission / 100 * 2) for k, lot, price in zip(lot_counts, lots, prices))
+            if costs <= capital + 1e-9:
+                best = max(best, sum(k * lot * dividend for k, lot, dividend in zip(lot_counts, lots, dividends)))
+
+        return best * (1 - tax / 100)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(15)
+
+        for _ in range(40):
+            size = rng.randint(1, 4)
+            # Капитал 10 000 при CAPITAL_RESOLUTION = 10 000 дает шаг 1 рубль, цены целые — дискретизация точная
+            capital = 10_000
+            prices = [rng.randint(1, 40) * 50 for _ in range(size)]
+            dividends = [price * rng.uniform(0.001, 0.015) for price in prices]
+            max_parts = [rng.choice([10, 20, 50, 100]) for _ in range(size)]
+            lots = [rng.choice([1, 1, 2, 10]) for _ in range(size)]
+            commission = rng.choice([0, 0.5])
+
+            counts = allocate(prices, dividends, max_parts, capital, commission, 13, lots)
+
+            costs = sum(count * price * (1 + commission / 100 * 2) for count, price in zip(counts, prices))
+            self.assertLessEqual(costs, capital + 1e-6)
+            for count, price, dividend, max_part, lot in zip(counts, prices, dividends, max_parts, lots):
+                self.assertEqual(count % lot, 0)
+                self.assertLessEqual(count * price, capital * max_part / 100 + 1e-6)
+                self.assertLessEqual(count * dividend, capital * MONTHLY_DIVIDEND_LIMIT + 1e-6)
+
+            value = sum(count * dividend for count, dividend in zip(counts, dividends)) * (1 - 13 / 100)
+            expected = self.brute_force(prices, dividends, max_parts, capital, commission, 13, lots)
+            self.assertAlmostEqual(value, expected, places=6)
+
+    def test_max_part_cap(self):
+        # Без ограничения доли весь капитал ушел бы в самую доходную акцию
+        counts = allocate([100, 100], [1.5, 1], [20, 100], 10_000, 0, 0)
+
+        self.assertEqual(counts.tolist(), [20, 80])
+
+    def test_lots(self):
+        counts = allocate([100], [1], [100], 10_000, 0, 0, lots=[30])
+
+        self.assertEqual(counts.tolist(), [90])
+
+    def test_zero_capital(self):
+        self.assertEqual(allocate([100, 50], [5, 2], [100, 100], 0, 0.05, 13).tolist(), [0, 0])
+        self.assertEqual(allocate([], [], [], 10_000, 0.05, 13).tolist(), [])
+
+
+class PriceHistoryCompactionTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        AssetData.objects.create(ticker='SBER', class_code='TQBR', price=120 * NANO, logo_url='')
+
+    def day(self, days_ago):
+        return self.today - timedelta(days=days_ago)
+
+    def add_price(self, days_ago, hour, rub):
+        timestamp = timezone.make_aware(datetime.combine(self.day(days_ago), day_time(hour)))
+        PriceHistory.objects.create(ticker='SBER', class_code='TQBR', timestamp=timestamp, price=rub * NANO)
+
+    def ohlc(self):
+        return {
+            row.date: (row.open // NANO, row.high // NANO, row.low // NANO, row.close // NANO)
+            for row in PriceDaily.objects.filter(ticker='SBER')
+        }
+
+    def test_forward_fill_and_open(self):
+        self.add_price(10, 10, 100)
+        self.add_price(10, 12, 110)
+        self.add_price(10, 15, 105)
+        # За 9 дней назад изменений цены не было
+        self.add_price(8, 11, 120)
+        self.add_price(2, 11, 130)
+
+        self.assertEqual(compact_history(raw_days=7), (3, 4, 0))
+        self.assertEqual(self.ohlc(), {
+            self.day(10): (100, 110, 100, 105),
+            self.day(9): (105, 105, 105, 105),
+            # Открытие — закрытие предыдущего дня, а не первое изменение цены
+            self.day(8): (105, 120, 105, 120),
+        })
+        self.assertEqual(PriceHistory.objects.count(), 1)
+
+        # Следующая свертка продолжает ряд от последнего закрытия в PriceDaily
+        self.assertEqual(compact_history(raw_days=6), (1, 0, 0))
+        self.assertEqual(self.ohlc()[self.day(7)], (120, 120, 120, 120))
+
+        dates, closes = get_daily_closes('SBER', 'TQBR')
+        self.assertEqual(dates.tolist(), [self.day(days_ago) for days_ago in range(10, 1, -1)])
+        self.assertEqual((closes // NANO).tolist(), [105, 105, 120, 120, 120, 120, 120, 120, 130])
+
+    def test_untracked_series_not_filled(self):
+        PriceDaily.objects.create(
+            ticker='OLD', class_code='TQBR', date=self.day(12), open=NANO, high=NANO, low=NANO, close=NANO
+        )
+
+        compact_history(raw_days=7)
+
+        self.assertEqual(PriceDaily.objects.filter(ticker='OLD').count(), 1)
+
+    def test_retention(self):
+        for days_ago in (20, 10):
+            PriceDaily.objects.create(
+                ticker='SBER', class_code='TQBR', date=self.day(days_ago),
+                open=100 * NANO, high=100 * NANO, low=100 * NANO, close=100 * NANO
+            )
+
+        _, _, daily_deleted = compact_history(raw_days=9, retention_days=15)
+
+        self.assertEqual(daily_deleted, 1)
+        self.assertEqual(sorted(self.ohlc()), [self.day(10)])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UserSettingsCacheTests(TestCase):
+    def setUp(self):
+        # Настройки создаются сигналом при регистрации пользователя
+        self.user = User.objects.create_user(username='investor', password='password')
+
+    def tearDown(self):
+        cache.delete(settings_cache_key(self.user.pk))
+
+    def test_cached_values_not_instances(self):
+        self.assertEqual(load_settings(self.user.pk).available_capital, 4000)
+
+        cached = cache.get(settings_cache_key(self.user.pk))
+        self.assertIsInstance(cached, dict)
+        self.assertEqual(cached['owner_id'], self.user.pk)
+
+    def test_save_invalidates_cache(self):
+        load_settings(self.user.pk)
+
+        user_settings = Settings.objects.get(owner=self.user)
+        user_settings.available_capital = 500_000
+        user_settings.save()
+
+        self.assertIsNone(cache.get(settings_cache_key(self.user.pk)))
+        self.assertEqual(load_settings(self.user.pk).available_capital, 500_000)
+        self.assertEqual(asyncio.run(aload_settings(self.user.pk)).available_capital, 500_000)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BacktestTests(TestCase):
+    @staticmethod
+    def reference(dates, prices, key_rate, markup, buy_step):
+        """Правило продажи CheckAssets.get_is_can_sold, проигранное циклом по каждой покупке"""
+        months = [day.year * 12 + day.month for day in dates]
+        returns, hit_returns, hit_days = [], [], []
+
+        for i in range(0, len(prices) - 1, buy_step):
+            sell = len(prices) - 1
+            for j in range(i + 1, len(prices)):
+                growth = max(key_rate / (months[j] - months[i] or 1), markup)
+                if prices[j] > prices[i] * (1 + growth):
+                    sell = j
+                    hit_returns.append(prices[j] / prices[i] - 1)
+                    hit_days.append((dates[j] - dates[i]).days)
+                    break
+            returns.append(prices[sell] / prices[i] - 1)
+
+        return {
+            'hit_rate': len(hit_returns) / len(returns),
+            'avg_return': np.mean(hit_returns) if hit_returns else np.nan,
+            'avg_holding_days': np.mean(hit_days) if hit_days else np.nan,
+            'mtm_return': np.mean(returns)
+        }
+
+    def test_simple_series(self):
+        dates = [date(2025, 1, 1) + timedelta(days=i) for i in range(3)]
+        metrics = backtest.simulate(dates, [100, 105, 130], [0.2, 0.5], [0.1, 0.1])
+
+        self.assertEqual(metrics['hit_rate'].tolist(), [1, 0])
+        self.assertAlmostEqual(metrics['avg_return'][0], (0.3 + 130 / 105 - 1) / 2)
+        self.assertEqual(metrics['avg_holding_days'][0], 1.5)
+        # Непроданные позиции оцениваются по последней цене
+        self.assertTrue(np.isnan(metrics['avg_return'][1]))
+        self.assertAlmostEqual(metrics['mtm_return'][1], (0.3 + 130 / 105 - 1) / 2)
+
+    def test_matches_reference(self):
+        rng = np.random.default_rng(14)
+        dates = [date(2024, 1, 1) + timedelta(days=i) for i in range(120)]
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        grid = [(key_rate, markup) for key_rate in (0.05, 0.16, 0.3) for markup in (0, 0.05, 0.1)]
+        key_rates, markups = zip(*grid)
+
+        # Маленький размер блока проверяет расчет по частям сетки и по блокам дат покупки
+        for max_elements in (10_000, 1_000):
+            with mock.patch.object(backtest, 'MAX_CHUNK_ELEMENTS', max_elements):
+                metrics = backtest.simulate(dates, prices, key_rates, markups, buy_step=3)
+
+            for i, (key_rate, markup) in enumerate(grid):
+                expected = self.reference(dates, prices, key_rate, markup, 3)
+                for name, value in expected.items():
+                    np.testing.assert_allclose(metrics[name][i], value, err_msg=f'{name} {key_rate} {markup}')
+
+    def test_run_backtest_computes_missing_only(self):
+        dates = np.arange('2025-01-01', '2025-03-01', dtype='datetime64[D]')
+        prices = np.linspace(100, 130, len(dates))
+        name = f'test:{time.time_ns()}'
+        self.addCleanup(cache.delete_pattern, f'backtest:{name}:*')
+
+        with mock.patch.object(backtest, 'simulate', wraps=backtest.simulate) as simulate:
+            first = backtest.run_backtest(name, dates, prices, [(0.16, 0.05)])
+            second = backtest.run_backtest(name, dates, prices, [(0.16, 0.05), (0.3, 0.1)])
+
+        self.assertEqual(second[(0.16, 0.05)], first[(0.16, 0.05)])
+        self.assertEqual(simulate.call_count, 2)
+        self.assertEqual(simulate.call_args.args[2:4], ((0.3,), (0.1,)))
+
+    def test_run_backtest_without_redis(self):
+        dates = np.arange('2025-01-01', '2025-03-01', dtype='datetime64[D]')
+        prices = np.linspace(100, 130, len(dates))
+        expected = backtest.simulate(dates, prices, [0.16], [0.05])
+
+        with mock.patch.object(backtest.cache, 'get_many', side_effect=RedisError), \
+                mock.patch.object(backtest.cache, 'set_many', side_effect=RedisError), \
+                self.assertLogs('strategy.backtest', 'WARNING'):
+            results = backtest.run_backtest('test:no-redis', dates, prices, [(0.16, 0.05)])
+
+        self.assertEqual(results[(0.16, 0.05)]['hit_rate'], expected['hit_rate'][0])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CandidatesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.investor = User.objects.create_user(username='investor', password='password')
+        cls.other = User.objects.create_user(username='other', password='password')
+        Settings.objects.update(
+            available_capital=100_000,
+            broker_commission=0,
+            dividends_from_date=date(2025, 1, 1),
+            dividends_to_date=date(2025, 12, 31)
+        )
+
+        prices = {'SBER': 300, 'LKOH': 7000, 'GAZP': 150}
+        dividends = {'SBER': 30, 'LKOH': 500, 'GAZP': 15}
+        AssetData.objects.bulk_create(
+            AssetData(ticker=ticker, class_code='TQBR', price=price * NANO, logo_url='')
+            for ticker, price in prices.items()
+        )
+        DividendCalendar.objects.bulk_create(
+            DividendCalendar(
+                ticker=ticker, company_name=ticker, payday=date(2025, 7, 1), dividend=dividend * NANO,
+                updated_at=timezone.now()
+            )
+            for ticker, dividend in dividends.items()
+        )
+        AssetDividend.objects.bulk_create([
+            AssetDividend(ticker='SBER', max_part=50, owner=cls.investor),
+            AssetDividend(ticker='LKOH', max_part=50, owner=cls.investor),
+            # Без максимальной доли акция не участвует в расчете
+            AssetDividend(ticker='GAZP', owner=cls.investor),
+            AssetDividend(ticker='SBER', max_part=100, owner=cls.other),
+        ])
+
+    def setUp(self):
+        # Цены читаются из базы, снимок в Redis не используется
+        get_redis_connection('default').delete(snapshot_key())
+        for owner in (self.investor, self.other):
+            AssetCandidates.objects.create(
+                ticker='OLD', price=NANO, count=1, costs=NANO, share=1, dividend=NANO, owner=owner
+            )
+
+    def tearDown(self):
+        cache.delete_pattern('*')
+
+    def candidate_tickers(self, owner):
+        return set(AssetCandidates.objects.filter(owner=owner).values_list('ticker', flat=True))
+
+    def test_refresh_replaces_only_given_owners(self):
+        count, incomplete = refresh_candidates([Settings.objects.get(owner=self.investor)])
+
+        self.assertEqual(count, 2)
+        self.assertEqual(incomplete, {self.investor: ['GAZP']})
+        self.assertEqual(self.candidate_tickers(self.investor), {'SBER', 'LKOH'})
+        self.assertEqual(self.candidate_tickers(self.other), {'OLD'})
+
+        costs = AssetCandidates.objects.filter(owner=self.investor).values_list('costs', flat=True)
+        self.assertLessEqual(sum(costs), 100_000 * NANO)
+
+    def test_price_rounded_to_step(self):
+        AssetData.objects.filter(ticker='SBER').update(price=rub_to_nano('300.3'), min_price_increment=NANO)
+
+        refresh_candidates([Settings.objects.get(owner=self.investor)])
+
+        candidate = AssetCandidates.objects.get(owner=self.investor, ticker='SBER')
+        self.assertEqual(candidate.price, 301 * NANO)
+        self.assertGreater(candidate.count, 0)
+        self.assertEqual(candidate.costs, candidate.count * 301 * NANO)
+
+    def test_failed_insert_keeps_previous_candidates(self):
+        with mock.patch.object(AssetCandidates.objects, 'bulk_create', side_effect=DatabaseError('insert failed')):
+            with self.assertRaises(DatabaseError):
+                refresh_candidates([Settings.objects.get(owner=self.investor)])
+
+        # Удаление откатывается вместе с неудачной вставкой
+        self.assertEqual(self.candidate_tickers(self.investor), {'OLD'})
+
+    def test_all_user_settings(self):
+        first = Settings.objects.get(owner=self.investor)
+        Settings.objects.create(
+            available_capital=1, broker_commission=0, dividend_tax=13, central_bank_rate=0.2,
+            dividends_from_date=date(2025, 1, 1), dividends_to_date=date(2025, 1, 1), tg_id=0, owner=self.investor
+        )
+
+        # Владельцы загружаются тем же запросом
+        with self.assertNumQueries(1):
+            settings_list = get_all_user_settings()
+            owners = [user_settings.owner.username for user_settings in settings_list]
+
+        self.assertEqual(sorted(owners), ['investor', 'other'])
+        self.assertIn(first.pk, [user_settings.pk for user_settings in settings_list])
+
+    def test_get_candidates_all_users(self):
+        stdout = StringIO()
+        call_command('get_candidates', all_users=True, stdout=stdout)
+
+        self.assertEqual(self.candidate_tickers(self.investor), {'SBER', 'LKOH'})
+        self.assertEqual(self.candidate_tickers(self.other), {'SBER'})
+        output = stdout.getvalue()
+        self.assertIn('investor: пропущено 1 акций без необходимых данных (GAZP)', output)
+        self.assertIn('Рассчитано 3 кандидатов для 2 пользователей', output)
+
+
+@skipUnless(find_spec('t_tech'), 't-tech-investments не установлен')
+class SyncAssetsTests(TestCase):
+    def setUp(self):
+        AssetData.objects.bulk_create([
+            AssetData(figi='F1', ticker='SBER', class_code='TQBR', price=100 * NANO, logo_url=''),
+            AssetData(figi='F2', ticker='GAZP', class_code='TQBR', price=150 * NANO, logo_url=''),
+            AssetData(figi='F3', ticker='GONE', class_code='TQBR', price=10 * NANO, logo_url=''),
+            # Запись до появления FIGI сопоставляется по тикеру и секции
+            AssetData(figi=None, ticker='LKOH', class_code='TQBR', price=7000 * NANO, logo_url=''),
+            AssetData(figi='F5', ticker='AAA', class_code='TQBR', price=1 * NANO, logo_url=''),
+            AssetData(figi='F6', ticker='BBB', class_code='TQBR', price=2 * NANO, logo_url=''),
+        ])
+
+    def sync(self, assets):
+        from strategy.management.commands.updates_assets import Command as UpdatesAssetsCommand
+
+        listed_figis = {asset.figi for asset in assets} | {'F2'}
+        return UpdatesAssetsCommand().sync_assets(assets, listed_figis)
+
+    def test_sync_by_figi(self):
+        ids = dict(AssetData.objects.exclude(figi=None).values_list('figi', 'pk'))
+        assets = [
+            AssetData(figi='F1', ticker='SBER', class_code='TQBR', price=110 * NANO, logo_url=''),
+            AssetData(figi='F4', ticker='LKOH', class_code='TQBR', price=7000 * NANO, logo_url=''),
+            # Инструменты обменялись тикерами
+            AssetData(figi='F5', ticker='BBB', class_code='TQBR', price=1 * NANO, logo_url=''),
+            AssetData(figi='F6', ticker='AAA', class_code='TQBR', price=2 * NANO, logo_url=''),
+            AssetData(figi='F7', ticker='NEW', class_code='TQBR', price=5 * NANO, logo_url=''),
+        ]
+
+        # GAZP в справочнике, но без цены: запись сохраняется без изменений; GONE пропал из справочника
+        self.assertEqual(self.sync(assets), (4, 1, 1))
+
+        rows = {figi: (pk, ticker, price // NANO) for figi, pk, ticker, price in AssetData.objects.values_list(
+            'figi', 'pk', 'ticker', 'price'
+        )}
+        self.assertEqual(rows, {
+            'F1': (ids['F1'], 'SBER', 110),
+            'F2': (ids['F2'], 'GAZP', 150),
+            'F4': (rows['F4'][0], 'LKOH', 7000),
+            'F5': (ids['F5'], 'BBB', 1),
+            'F6': (ids['F6'], 'AAA', 2),
+            'F7': (rows['F7'][0], 'NEW', 5),
+        })
+        self.assertEqual(
+            sorted(PriceHistory.objects.values_list('ticker', flat=True)), ['AAA', 'BBB', 'LKOH', 'NEW', 'SBER']
+        )
+
+    def test_unchanged_assets_not_written(self):
+        assets = [
+            AssetData(figi=figi, ticker=ticker, class_code='TQBR', price=price, logo_url='')
+            for figi, ticker, price in AssetData.objects.exclude(figi=None).values_list('figi', 'ticker', 'price')
+        ]
+
+        with self.assertNumQueries(4):
+            self.assertEqual(self.sync(assets), (0, 0, 1))
+        self.assertFalse(PriceHistory.objects.exists())
+
+
+class FakeMarketData:
+    """get_last_prices, отклоняющий батчи больше limit и батчи с FIGI из rejected"""
+
+    def __init__(self, limit=1000, rejected=()):
+        self.limit = limit
+        self.rejected = set(rejected)
+        self.sizes = []
+
+    async def get_last_prices(self, figi, instrument_status):
+        from grpc import StatusCode
+        from t_tech.invest.exceptions import AioRequestError
+
+        self.sizes.append(len(figi))
+        if len(figi) > self.limit or self.rejected & set(figi):
+            raise AioRequestError(StatusCode.INVALID_ARGUMENT, 'invalid argument', None)
+
+        return SimpleNamespace(
+            last_prices=[SimpleNamespace(figi=item, price=Quotation(units=1, nano=0)) for item in figi]
+        )
+
+
+@skipUnless(find_spec('t_tech'), 't-tech-investments не установлен')
+@override_settings(CACHES=TEST_CACHES)
+class PriceBatchTests(TestCase):
+    def setUp(self):
+        from strategy.management.commands import updates_assets
+
+        self.module = updates_assets
+        patcher = mock.patch.object(updates_assets, 'wait_api_limit', mock.AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.delete, updates_assets.BATCH_SIZE_KEY)
+        self.figis = [f'F{i}' for i in range(16)]
+
+    def get_prices(self, market_data):
+        command = self.module.Command(stdout=StringIO())
+        client = SimpleNamespace(market_data=market_data)
+
+        async def run():
+            return await command.get_asset_values_batch(client, asyncio.Semaphore(4), self.figis)
+
+        return asyncio.run(run())
+
+    def test_rejected_size_is_learned_after_success(self):
+        prices = self.get_prices(FakeMarketData(limit=8))
+
+        self.assertEqual(set(prices), set(self.figis))
+        self.assertEqual(cache.get(self.module.BATCH_SIZE_KEY), 8)
+
+    def test_bad_figi_is_skipped(self):
+        market_data = FakeMarketData(rejected={'F5'})
+        prices = self.get_prices(market_data)
+
+        self.assertEqual(set(prices), set(self.figis) - {'F5'})
+        # Отклонение из-за содержимого не уменьшает размер батча следующих запусков
+        self.assertIsNone(cache.get(self.module.BATCH_SIZE_KEY))
+        self.assertEqual(market_data.sizes, [16, 8, 8, 4, 4, 2, 2, 1, 1])
+
+    def test_both_halves_rejected(self):
+        from t_tech.invest.exceptions import AioRequestError
+
+        market_data = FakeMarketData(limit=4)
+        with self.assertRaises(AioRequestError):
+            self.get_prices(market_data)
+
+        self.assertEqual(market_data.sizes, [16, 8, 8])
+        self.assertIsNone(cache.get(self.module.BATCH_SIZE_KEY))
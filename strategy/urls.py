@@ -7,6 +7,7 @@ urlpatterns = [
     path('settings/', views.settings_edit, name='settings'),
     path('dividend_stocks', views.devidends, name='dividend_stocks'),
     path('update-dividends/', views.update_dividends, name='update_dividends'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
     path('add_asset/', views.asset_add, name='add_asset'),
     path('delete_asset/<int:pk>/', views.asset_delete, name='delete_asset'),
     path('candidates/', views.candidates, name='candidates'),
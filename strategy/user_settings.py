@@ -0,0 +1,112 @@
+import zlib
+
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from strategy.models import Settings
+
+SETTINGS_CACHE_TIMEOUT = 24 * 3600
+
+# В кеше хранятся значения полей, а не экземпляры модели; версия схемы в ключе
+# меняется при добавлении или удалении полей, и старые значения не читаются
+SETTINGS_FIELDS = tuple(field.attname for field in Settings._meta.concrete_fields)
+SETTINGS_SCHEMA = zlib.crc32(','.join(SETTINGS_FIELDS).encode())
+
+
+def settings_cache_key(owner_id):
+    return f'user_settings:{owner_id}:{SETTINGS_SCHEMA}'
+
+
+def settings_values(owner_id):
+    return Settings.objects.filter(owner_id=owner_id).order_by('pk').values(*SETTINGS_FIELDS)
+
+
+def build_settings(values):
+    """Экземпляр Settings из закешированных значений полей
+
+    Предназначен только для чтения: для изменения настроек загружайте запись из базы.
+    """
+    if values is None:
+        return None
+
+    return Settings.from_db('default', SETTINGS_FIELDS, [values[field] for field in SETTINGS_FIELDS])
+
+
+def load_settings(owner_id):
+    """Настройки владельца из Redis с загрузкой из базы при промахе
+
+    Кеш сбрасывается сигналами при сохранении и удалении настроек.
+    При недоступности Redis настройки читаются из базы.
+    """
+    key = settings_cache_key(owner_id)
+    try:
+        values = cache.get(key)
+    except RedisError:
+        return build_settings(settings_values(owner_id).first())
+
+    if values is None:
+        values = settings_values(owner_id).first()
+        if values is not None:
+            try:
+                cache.set(key, values, SETTINGS_CACHE_TIMEOUT)
+            except RedisError:
+                pass
+
+    return build_settings(values)
+
+
+def invalidate_settings(owner_id):
+    try:
+        cache.delete(settings_cache_key(owner_id))
+    except RedisError:
+        pass
+
+
+def get_user_settings(user):
+    """Настройки пользователя, загружаемые один раз на объект пользователя
+
+    В представлениях объект пользователя живет в рамках запроса, в командах —
+    в рамках выполнения команды, поэтому повторные обращения не идут ни в Redis,
+    ни в базу.
+    """
+    if not hasattr(user, '_user_settings'):
+        user._user_settings = load_settings(user.pk)
+
+    return user._user_settings
+
+
+async def aload_settings(owner_id):
+    """Асинхронный вариант load_settings для асинхронных представлений"""
+    key = settings_cache_key(owner_id)
+    try:
+        values = await cache.aget(key)
+    except RedisError:
+        return build_settings(await settings_values(owner_id).afirst())
+
+    if values is None:
+        values = await settings_values(owner_id).afirst()
+        if values is not None:
+            try:
+                await cache.aset(key, values, SETTINGS_CACHE_TIMEOUT)
+            except RedisError:
+                pass
+
+    return build_settings(values)
+
+
+async def aget_user_settings(user):
+    """Асинхронный вариант get_user_settings"""
+    if not hasattr(user, '_user_settings'):
+        user._user_settings = await aload_settings(user.pk)
+
+    return user._user_settings
+
+
+def get_all_user_settings():
+    """Настройки всех пользователей одним запросом: по первой записи на владельца"""
+    settings_by_owner = {}
+
+    for user_settings in Settings.objects.select_related('owner').order_by('pk'):
+        settings_by_owner.setdefault(user_settings.owner_id, user_settings)
+
+    return list(settings_by_owner.values())
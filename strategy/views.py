@@ -1,69 +1,101 @@
+import asyncio
 import json
-import subprocess
+from decimal import InvalidOperation
 
+from asgiref.sync import sync_to_async
+from celery.result import AsyncResult
 from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth import get_user_model, authenticate, login, logout
+from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from . import tasks
 from .forms import SettingsForm, CheckAssetsForm
-from .models import CheckAssets, AssetData, Settings, AssetDividend, AssetCandidates
+from .dividends import aload_user_dividends
+from .money import rub_to_nano
+from .models import CheckAssets, DividendCalendar, AssetDividend, AssetCandidates, Settings
+from .page_cache import aget_cached_page
+from .portfolio import Portfolio
+from .price_snapshot import aget_market_data
+from .user_settings import aget_user_settings
+
+
+async def fetch_all(queryset):
+    return [row async for row in queryset]
+
+
+async def get_request_user(request):
+    """Пользователь запроса для асинхронных представлений
+
+    Контекстный процессор auth читает request.user отдельно от request.auser(),
+    поэтому без подмены пользователь загружался бы из базы повторно при рендеринге.
+    """
+    user = await request.auser()
+    request.user = user
+
+    return user
 
 
 @login_required
-def dashboard(request):
-    user = get_user_model().objects.filter(username=request.user).first()
-    assets = CheckAssets.objects.filter(owner=user.pk).all()
+async def dashboard(request):
+    user = await get_request_user(request)
+    page = await aget_cached_page('dashboard', user.pk)
+    if page['page_fragment'] is not None:
+        return await sync_to_async(render)(request, 'strategy/dashboard.html', page)
+
+    # Позиции и ключевая ставка владельца читаются одним запросом, цены и логотипы — из снимка в Redis
+    portfolio = await Portfolio.aload(CheckAssets.objects.filter(owner=user))
     data = {}
-    total_price = 0
-    total_p_f = 0
-    total_owner_period = 0
 
-    for asset in assets:
-        asset_data = AssetData.objects.filter(ticker=asset.ticker).first()
-        last_price = asset_data.get_price()
-        asset.set_current_price(last_price)
-        total_price += last_price * asset.buy_count
-        holding_time = asset.get_holding_time()
-        total_owner_period = max(total_owner_period, holding_time)
-        price_diff = asset.get_price_diff()
-        total_p_f += price_diff
-        expected_price_by_key_rate = asset.get_expected_price_by_key_rate()
-        is_can_sold = asset.get_is_can_sold()
-        is_danger = asset.get_is_danger()
-        logo_url = asset_data.logo_url
-        data[f'{asset.ticker}_{asset.pk}'] = (
+    rows = zip(
+        portfolio.ticker,
+        portfolio.pk.tolist(),
+        portfolio.logo_url,
+        portfolio.buy_price.tolist(),
+        portfolio.buy_count.tolist(),
+        portfolio.buy_date.tolist(),
+        portfolio.holding_time.tolist(),
+        portfolio.current_price.tolist(),
+        portfolio.price_diff.tolist(),
+        portfolio.expected_price_by_key_rate.tolist(),
+        portfolio.is_can_sold.tolist(),
+        portfolio.excepted_price.tolist(),
+        portfolio.is_danger.tolist()
+    )
+    for (ticker, pk, logo_url, buy_price, buy_count, buy_date, holding_time, current_price, price_diff,
+         expected_price_by_key_rate, is_can_sold, excepted_price, is_danger) in rows:
+        data[f'{ticker}_{pk}'] = (
             logo_url, #0
-            asset.buy_price, #1
-            asset.buy_count, #2
-            asset.buy_date, #3
+            buy_price, #1
+            buy_count, #2
+            buy_date, #3
             holding_time, #4
-            asset.current_price, #5
+            current_price, #5
             price_diff, #6
             expected_price_by_key_rate, #7
             is_can_sold, #8
-            asset.excepted_price, #9
+            excepted_price, #9
             is_danger, #10
-            asset.pk #11
+            pk #11
         )
 
-    total_assets = len(assets)
-
     context = {
         'assets': data,
-        'total_assets': total_assets,
-        'total_price': total_price,
-        'total_p_f': total_p_f,
-        'total_owner_period': total_owner_period
+        'total_assets': len(portfolio),
+        'total_price': portfolio.total_price,
+        'total_p_f': portfolio.total_p_f,
+        'total_owner_period': portfolio.total_owner_period,
+        **page
     }
 
-    return render(request, 'strategy/dashboard.html', context)
+    return await sync_to_async(render)(request, 'strategy/dashboard.html', context)
 
 
 @login_required
@@ -81,7 +113,9 @@ def update_item(request, item_id):
             case 'check_asset':
                 asset = CheckAssets.objects.get(id=item_id)
             case 'asset_dividend':
-                asset = AssetDividend.objects.get(id=item_id)
+                # Настройки пользователя хранятся отдельно от календаря и создаются при первом изменении
+                dividend = DividendCalendar.objects.get(id=item_id)
+                asset, _ = AssetDividend.objects.get_or_create(owner=request.user, ticker=dividend.ticker)
             case _:
                 return JsonResponse({'success': False, 'error': f'База {base} не найдена'})
 
@@ -92,7 +126,7 @@ def update_item(request, item_id):
         # Преобразуем значение в нужный тип
         try:
             if field in ['buy_price', 'excepted_price']:
-                value = float(value)
+                value = rub_to_nano(value)
             elif field in ['buy_count', 'priority', 'max_part']:
                 value = int(value)
             elif field in ['buy_date']:
@@ -102,6 +136,8 @@ def update_item(request, item_id):
                 return JsonResponse({'success': False, 'error': f'Поле {field} отсутствует в базе {base}'})
         except ValueError as err:
             return JsonResponse({'success': False, 'error': f'Некорректное числовое значение: {err}'})
+        except InvalidOperation:
+            return JsonResponse({'success': False, 'error': f'Некорректное числовое значение: {value}'})
 
         # Обновляем поле
         if hasattr(asset, field):
@@ -125,15 +161,15 @@ def update_item(request, item_id):
         else:
             return JsonResponse({'success': False, 'error': f'Поле {field} не существует'})
 
-    except CheckAssets.DoesNotExist:
+    except (CheckAssets.DoesNotExist, DividendCalendar.DoesNotExist):
         return JsonResponse({'success': False, 'error': 'Объект не найден'})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 @login_required
 def settings_edit(request):
-    user = get_user_model().objects.filter(username=request.user).first()
-    settings = Settings.objects.filter(owner=user).first()
+    # Форма сохраняет запись, поэтому она читается из базы, а не из кеша настроек
+    settings = Settings.objects.filter(owner=request.user).order_by('pk').first()
 
     if request.method == 'POST':
         form = SettingsForm(request.POST, instance=settings)
@@ -150,18 +186,19 @@ def settings_edit(request):
     return render(request, 'strategy/settings.html', context)
 
 @login_required
-def devidends(request):
-    username = request.user
-    user = get_object_or_404(User, username=username)
-    date_from = Settings.objects.filter(owner=user).first().dividends_from_date
-    date_to = Settings.objects.filter(owner=user).first().dividends_to_date
-    assets = AssetDividend.objects.filter(owner=user).all()
+async def devidends(request):
+    user = await get_request_user(request)
+    page = await aget_cached_page('dividends', user.pk)
+    if page['page_fragment'] is not None:
+        return await sync_to_async(render)(request, 'strategy/dividends.html', page)
+
+    user_settings = await aget_user_settings(user)
+    assets = (await aload_user_dividends([user_settings]))[user.pk]
     data = {}
 
     for asset in assets:
-        asset_data = AssetData.objects.filter(ticker=asset.ticker).first()
         data[asset.ticker] = (
-            asset_data.logo_url, #0
+            asset.logo_url, #0
             asset.company_name, #1
             asset.payday, #2
             asset.dividend, #3
@@ -173,41 +210,26 @@ def devidends(request):
         )
 
     context = {
-        'date_from': date_from,
-        'date_to': date_to,
-        'assets': data
+        'date_from': user_settings.dividends_from_date,
+        'date_to': user_settings.dividends_to_date,
+        'assets': data,
+        **page
     }
 
-    return render(request, 'strategy/dividends.html', context)
+    return await sync_to_async(render)(request, 'strategy/dividends.html', context)
 
 
-@login_required
-@require_POST
-def update_dividends(request):
-    """Выполняет команду обновления дивидендов"""
+def start_job(request, task):
+    """Постановка задачи в очередь Celery с привязкой к текущему пользователю"""
     try:
-        # Запускаем команду обновления дивидендов
-        username = request.user
-        user_pk = get_object_or_404(User, username=username).pk
-        result = subprocess.run(
-            ['python3', 'manage.py', 'updates_dividends', '--user-id', str(user_pk)],
-            capture_output=True,
-            text=True,
-            cwd=settings.BASE_DIR
-        )
+        job = task.delay(request.user.pk)
+        cache.set(f'job_owner:{job.id}', request.user.pk, settings.CELERY_RESULT_EXPIRES)
 
-        if result.returncode == 0:
-            return JsonResponse({
-                'status': 'success',
-                'message': 'Данные о дивидендах успешно обновлены',
-                'refresh': True  # Флаг для перезагрузки страницы
-            })
-        else:
-            print(result.stderr)
-            return JsonResponse({
-                'status': 'error',
-                'message': f'Ошибка при выполнении команды: {result.stderr}'
-            }, status=500)
+        return JsonResponse({
+            'status': 'accepted',
+            'job_id': job.id,
+            'status_url': reverse('job_status', args=[job.id])
+        }, status=202)
 
     except Exception as e:
         print(e)
@@ -216,6 +238,35 @@ def update_dividends(request):
             'message': f'Произошла ошибка: {str(e)}'
         }, status=500)
 
+
+@login_required
+@require_POST
+def update_dividends(request):
+    """Ставит в очередь команду обновления дивидендов"""
+    return start_job(request, tasks.updates_dividends)
+
+
+@login_required
+def job_status(request, job_id):
+    """Состояние фоновой задачи, запущенной пользователем"""
+    if cache.get(f'job_owner:{job_id}') != request.user.pk:
+        return JsonResponse({'status': 'error', 'message': 'Задача не найдена'}, status=404)
+
+    result = AsyncResult(job_id)
+    data = {'job_id': job_id, 'state': result.state, 'ready': result.ready()}
+
+    if result.state == 'PROGRESS':
+        data['progress'] = result.info
+    elif result.successful():
+        data['status'] = 'success'
+        data['message'] = 'Данные успешно обновлены'
+        data['refresh'] = True  # Флаг для перезагрузки страницы
+    elif result.failed():
+        data['status'] = 'error'
+        data['message'] = f'Ошибка при выполнении команды: {result.info}'
+
+    return JsonResponse(data)
+
 @login_required
 def asset_add(request):
     if request.method == 'POST':
@@ -246,45 +297,50 @@ def asset_delete(request, pk):
     return render(request, 'strategy/delete_asset.html', context)
 
 @login_required
-def candidates(request):
-    username = request.user
-    user = get_object_or_404(User, username=username)
-    date_from = Settings.objects.filter(owner=user).first().dividends_from_date
-    date_to = Settings.objects.filter(owner=user).first().dividends_to_date
-    assets = AssetCandidates.objects.filter(owner=user).all()
+async def candidates(request):
+    user = await get_request_user(request)
+    page = await aget_cached_page('candidates', user.pk)
+    if page['page_fragment'] is not None:
+        return await sync_to_async(render)(request, 'strategy/candidates.html', page)
+
+    assets = AssetCandidates.objects.filter(owner=user, count__gt=0)
+    user_settings, rows = await asyncio.gather(
+        aget_user_settings(user),
+        fetch_all(assets.values_list('ticker', 'price', 'count', 'costs', 'share', 'dividend'))
+    )
+    market = await aget_market_data({row[0] for row in rows})
     data = {}
     total_count = 0
     total_costs = 0
     total_share = 0
     total_dividend = 0
 
-    for asset in assets:
-        if asset.count:
-            asset_data = AssetData.objects.filter(ticker=asset.ticker).first()
-            data[asset.ticker] = (
-                asset_data.logo_url,  # 0
-                asset.price,  # 1
-                asset.count,  # 2
-                asset.costs,  # 3
-                asset.share,  # 4
-                asset.dividend,  # 5
-            )
-            total_count += asset.count
-            total_costs += asset.costs
-            total_share += asset.share
-            total_dividend += asset.dividend
+    for ticker, price, count, costs, share, dividend in rows:
+        data[ticker] = (
+            market.get(ticker, (None, None, None))[2],  # 0
+            price,  # 1
+            count,  # 2
+            costs,  # 3
+            share,  # 4
+            dividend,  # 5
+        )
+        total_count += count
+        total_costs += costs
+        total_share += share
+        total_dividend += dividend
 
     context = {
-        'date_from': date_from,
-        'date_to': date_to,
+        'date_from': user_settings.dividends_from_date,
+        'date_to': user_settings.dividends_to_date,
         'assets': data,
         'total_count': total_count,
         'total_costs': total_costs,
         'total_share': total_share,
-        'total_dividend': total_dividend
+        'total_dividend': total_dividend,
+        **page
     }
 
-    return render(request, 'strategy/candidates.html', context)
+    return await sync_to_async(render)(request, 'strategy/candidates.html', context)
 
 
 def login_view(request):
@@ -340,32 +396,5 @@ def logout_view(request):
 @login_required
 @require_POST
 def get_candidates(request):
-    try:
-        username = request.user
-        user_pk = get_object_or_404(User, username=username).pk
-        result = subprocess.run(
-            ['python3', 'manage.py', 'get_candidates', '--user-id', str(user_pk)],
-            capture_output=True,
-            text=True,
-            cwd=settings.BASE_DIR
-        )
-
-        if result.returncode == 0:
-            return JsonResponse({
-                'status': 'success',
-                'message': 'Данные о дивидендах успешно обновлены',
-                'refresh': True  # Флаг для перезагрузки страницы
-            })
-        else:
-            print(result.stderr)
-            return JsonResponse({
-                'status': 'error',
-                'message': f'Ошибка при выполнении команды: {result.stderr}'
-            }, status=500)
-
-    except Exception as e:
-        print(e)
-        return JsonResponse({
-            'status': 'error',
-            'message': f'Произошла ошибка: {str(e)}'
-        }, status=500)
+    """Ставит в очередь команду расчета кандидатов"""
+    return start_job(request, tasks.get_candidates)